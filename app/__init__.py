@@ -1,12 +1,15 @@
 import logging
 import os
+import sqlite3
 from datetime import datetime, timedelta
 
 import click
 from flask import Flask
 from flask_login import current_user
+from sqlalchemy import inspect, text
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+from . import metrics, profiling, static_assets
 from .config import Config
 from .extensions import csrf, db, login_manager, session_store
 from .models import (
@@ -25,7 +28,7 @@ def create_app():
 
     # Ensure flask_sessions directory exists for filesystem sessions
     session_dir = app.config.get("SESSION_FILE_DIR")
-    if session_dir:
+    if session_dir and app.config.get("SESSION_TYPE") == "filesystem":
         os.makedirs(session_dir, exist_ok=True)
 
     # Ensure data/ directory exists for SQLite database
@@ -43,6 +46,9 @@ def create_app():
     login_manager.init_app(app)
     csrf.init_app(app)
     session_store.init_app(app)
+    metrics.init_app(app)
+    profiling.init_app(app)
+    static_assets.init_app(app)
 
     from .auth import auth
     from .routes import main
@@ -83,12 +89,14 @@ def create_app():
                 if db_dir:
                     os.makedirs(db_dir, exist_ok=True)
             db.create_all()
+            _upgrade_schema()
         click.echo("Database initialized")
 
     @app.cli.command("seed-db")
     def seed_db():
         with app.app_context():
             db.create_all()
+            _upgrade_schema()
             _seed_data(app)
         click.echo("Database seeded")
 
@@ -96,6 +104,7 @@ def create_app():
     def bootstrap_workspace():
         with app.app_context():
             db.create_all()
+            _upgrade_schema()
             _bootstrap_workspace(app)
         click.echo("Workspace actualizado")
 
@@ -116,6 +125,222 @@ def create_app():
                 db.session.rollback()
                 click.echo(f"Error durante el cleanup: {e}", err=True)
 
+    @app.cli.command("archive-old-jobs")
+    @click.option("--days", type=int, default=None,
+                  help="Antiguedad minima en dias (por defecto, ARCHIVE_AFTER_DAYS).")
+    @click.option("--batch-size", type=int, default=50, help="PDFs por transaccion.")
+    @click.option("--vacuum", is_flag=True,
+                  help="Compacta la base al terminar (bloquea las escrituras mientras corre).")
+    def archive_old_jobs(days, batch_size, vacuum):
+        """Move the PDFs of old jobs out of the database into archive segments."""
+        from sqlalchemy import update
+
+        from .services.pdf_archive import ArchiveWriter
+
+        days = app.config["ARCHIVE_AFTER_DAYS"] if days is None else days
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        archived = 0
+        archived_bytes = 0
+        with app.app_context():
+            try:
+                with ArchiveWriter(
+                    app.config["ARCHIVE_DIR"], app.config["ARCHIVE_SEGMENT_MB"] * 1024 * 1024
+                ) as writer:
+                    last_id = 0
+                    while True:
+                        ids = [
+                            job_id
+                            for (job_id,) in db.session.query(ImgToPdfJob.id)
+                            .filter(
+                                ImgToPdfJob.id > last_id,
+                                ImgToPdfJob.created_at < cutoff,
+                                ImgToPdfJob.pdf_data.isnot(None),
+                            )
+                            .order_by(ImgToPdfJob.id)
+                            .limit(batch_size)
+                        ]
+                        if not ids:
+                            break
+                        rows = []
+                        for job_id in ids:
+                            data = (
+                                db.session.query(ImgToPdfJob.pdf_data)
+                                .filter(ImgToPdfJob.id == job_id)
+                                .scalar()
+                            )
+                            segment, offset, length = writer.append(job_id, data)
+                            rows.append({
+                                "id": job_id,
+                                "pdf_data": None,
+                                "pdf_size": len(data),
+                                "archive_segment": segment,
+                                "archive_offset": offset,
+                                "archive_length": length,
+                                "archived_at": datetime.utcnow(),
+                            })
+                            archived_bytes += len(data)
+                        # Rows only point at records that are already on disk.
+                        writer.sync()
+                        db.session.execute(update(ImgToPdfJob), rows)
+                        db.session.commit()
+                        archived += len(rows)
+                        last_id = ids[-1]
+            except ValueError as exc:
+                db.session.rollback()
+                raise click.ClickException(str(exc))
+            click.echo(
+                f"Archivo: {archived} PDFs ({archived_bytes / 1e6:.1f} MB) anteriores a "
+                f"{cutoff.date()} movidos a {app.config['ARCHIVE_DIR']}."
+            )
+            if vacuum and archived:
+                db.session.execute(text("VACUUM"))
+                click.echo("Base compactada.")
+
+    @app.cli.command("cleanup-sessions")
+    def cleanup_sessions():
+        """Delete expired server-side sessions (SQLite session store only)."""
+        interface = app.session_interface
+        if not hasattr(interface, "delete_expired"):
+            click.echo("El backend de sesiones actual no requiere limpieza.")
+            return
+        deleted = interface.delete_expired()
+        click.echo(f"Cleanup: {deleted} sesiones expiradas eliminadas.")
+
+    @app.cli.command("cleanup-preview-cache")
+    def cleanup_preview_cache():
+        """Delete stored preview images older than IMG_PREVIEW_CACHE_MAX_AGE."""
+        from .services.img_pdf import preview_store
+
+        removed = preview_store.cleanup(
+            app.config["IMG_PREVIEW_CACHE_DIR"], app.config["IMG_PREVIEW_CACHE_MAX_AGE"]
+        )
+        click.echo(f"Cleanup: {removed} imagenes de previsualizacion eliminadas.")
+
+    @app.cli.command("backup-db")
+    @click.option("--out", "out_dir", default=None, type=click.Path(file_okay=False),
+                  help="Carpeta de destino (por defecto, BACKUP_DIR).")
+    @click.option("--keep", type=int, default=None,
+                  help="Backups a conservar de cada tipo (por defecto, BACKUP_KEEP).")
+    @click.option("--no-blobs", is_flag=True,
+                  help="Solo metadatos: copia las tablas sin el contenido de los PDFs.")
+    @click.option("--pages", type=int, default=None, help="Paginas copiadas por paso.")
+    @click.option("--sleep", type=float, default=None, help="Pausa entre pasos, en segundos.")
+    def backup_db(out_dir, keep, no_blobs, pages, sleep):
+        """Back up the SQLite database online, without stopping the app."""
+        from .services import db_backup
+
+        with app.app_context():
+            url = db.engine.url
+        if url.get_backend_name() != "sqlite" or not url.database:
+            raise click.ClickException("backup-db solo funciona con una base SQLite en archivo.")
+        try:
+            result = db_backup.backup_sqlite(
+                url.database,
+                out_dir or app.config["BACKUP_DIR"],
+                keep=app.config["BACKUP_KEEP"] if keep is None else keep,
+                skip_blobs=no_blobs,
+                pages=pages or db_backup.STEP_PAGES,
+                sleep=db_backup.STEP_SLEEP if sleep is None else sleep,
+            )
+        except (ValueError, sqlite3.Error) as exc:
+            raise click.ClickException(f"Error durante el backup: {exc}")
+        click.echo(
+            f"Backup: {result.path} ({result.backup_bytes / 1e6:.1f} MB de "
+            f"{result.source_bytes / 1e6:.1f} MB) en {result.elapsed:.1f} s, "
+            f"{result.steps} pasos, {result.restarts} reinicios; "
+            f"{result.removed} backups antiguos eliminados."
+        )
+
+    @app.cli.command("img-to-pdf-batch")
+    @click.argument("source", type=click.Path(exists=True))
+    @click.option("--out", "out_dir", required=True, type=click.Path(file_okay=False),
+                  help="Carpeta de los PDFs y del estado para reanudar.")
+    @click.option("--workers", type=int, default=0, help="Procesos (0 = todos los CPUs).")
+    @click.option("--enhance-mode", type=click.Choice(["soft", "hard"]), default="soft")
+    @click.option("--prefix", default=None, help="Prefijo de los PDFs (por defecto, la entrada).")
+    @click.option("--register-as", "username", default=None,
+                  help="Registra los PDFs como trabajos de este usuario.")
+    @click.option("--no-resume", is_flag=True, help="Ignora el estado de una corrida anterior.")
+    def img_to_pdf_batch(source, out_dir, workers, enhance_mode, prefix, username, no_resume):
+        """Convert a folder or ZIP of photos into PDFs of up to 6 documents."""
+        from .services.img_batch import iter_unregistered, load_state, run_batch, save_state
+
+        with app.app_context():
+            user = None
+            if username:
+                user = User.query.filter_by(username=username).first()
+                if user is None:
+                    raise click.ClickException(f"No existe el usuario {username}.")
+
+            def report(result):
+                click.echo(
+                    f"\r{result.images} imagenes, {result.documents} documentos, "
+                    f"{result.images_per_second:.1f} img/s",
+                    nl=False,
+                )
+
+            try:
+                result = run_batch(
+                    source,
+                    out_dir,
+                    workers=workers or None,
+                    enhance_mode=enhance_mode,
+                    prefix=prefix,
+                    resume=not no_resume,
+                    progress=report,
+                    max_megapixels=app.config["IMG_MAX_INPUT_MEGAPIXELS"],
+                    nms_iou=app.config["IMG_NMS_IOU"],
+                )
+            except ValueError as exc:
+                raise click.ClickException(str(exc))
+            click.echo("")
+            click.echo(
+                f"Listo: {result.images} imagenes ({result.skipped} ya procesadas), "
+                f"{result.documents} documentos, {len(result.pdfs)} PDFs en "
+                f"{result.elapsed:.1f} s ({result.images_per_second:.2f} img/s)."
+            )
+            for key, error in result.failed.items():
+                click.echo(f"Error en {key}: {error}", err=True)
+
+            if user is None:
+                return
+            # Includes PDFs an interrupted run wrote but never registered; the
+            # per-PDF idempotency key keeps a rerun from inserting them twice.
+            state = load_state(out_dir, source)
+            registered = 0
+            for chunk in iter_unregistered(out_dir, state):
+                keys = [entry["key"] for entry, _ in chunk]
+                existing = {
+                    key
+                    for (key,) in db.session.query(ImgToPdfJob.idempotency_key).filter(
+                        ImgToPdfJob.user_id == user.id, ImgToPdfJob.idempotency_key.in_(keys)
+                    )
+                }
+                rows = [
+                    {
+                        "user_id": user.id,
+                        "workspace_id": user.workspace_id,
+                        "created_by_user_id": user.id,
+                        "filename": entry["name"],
+                        "pdf_filename": entry["name"],
+                        "status": "done",
+                        "page_count": entry["documents"],
+                        "pdf_data": data,
+                        "pdf_size": len(data),
+                        "idempotency_key": entry["key"],
+                    }
+                    for entry, data in chunk
+                    if entry["key"] not in existing
+                ]
+                if rows:
+                    db.session.execute(ImgToPdfJob.__table__.insert(), rows)
+                    db.session.commit()
+                for entry, _ in chunk:
+                    entry["registered"] = True
+                save_state(out_dir, state)
+                registered += len(rows)
+            click.echo(f"{registered} PDFs registrados para {user.username}.")
+
     return app
 
 
@@ -145,6 +370,55 @@ def _configure_logging():
         root.addHandler(handler)
 
 
+# Columns added after the first release, by table. ``create_all`` only creates
+# missing tables, so existing databases get them through ``_upgrade_schema``.
+_ADDED_COLUMNS = {
+    "img_to_pdf_job": {
+        "idempotency_key": "VARCHAR(64)",
+        "pdf_size": "INTEGER",
+        "archive_segment": "VARCHAR(32)",
+        "archive_offset": "BIGINT",
+        "archive_length": "INTEGER",
+        "archived_at": "DATETIME",
+        "processing_ms": "INTEGER",
+        "decode_ms": "INTEGER",
+        "detect_ms": "INTEGER",
+        "render_ms": "INTEGER",
+        "pdf_ms": "INTEGER",
+        "input_bytes": "INTEGER",
+        "input_megapixels": "FLOAT",
+    },
+}
+_ADDED_INDEXES = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_img_to_pdf_job_idempotency "
+    "ON img_to_pdf_job (user_id, idempotency_key)",
+    "CREATE INDEX IF NOT EXISTS ix_img_to_pdf_job_created_at ON img_to_pdf_job (created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_img_to_pdf_job_workspace_created "
+    "ON img_to_pdf_job (workspace_id, created_at)",
+)
+# Fill new columns for rows written before them; each must be idempotent.
+_BACKFILLS = (
+    "UPDATE img_to_pdf_job SET pdf_size = length(pdf_data) "
+    "WHERE pdf_size IS NULL AND pdf_data IS NOT NULL",
+)
+
+
+def _upgrade_schema():
+    """Add new nullable columns and indexes to tables created by older versions."""
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    with db.engine.begin() as conn:
+        for table, columns in _ADDED_COLUMNS.items():
+            if table not in tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table)}
+            for name, ddl in columns.items():
+                if name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+        for statement in _ADDED_INDEXES + _BACKFILLS:
+            conn.execute(text(statement))
+
+
 def _seed_data(app):
     if not app.config.get("ALLOW_SEED_DEMO"):
         return
@@ -36,7 +36,12 @@ class Config:
     WTF_CSRF_ENABLED = os.getenv("WTF_CSRF_ENABLED", "true").lower() == "true"
     WTF_CSRF_TIME_LIMIT = int(os.getenv("WTF_CSRF_TIME_LIMIT", "3600"))
 
-    SESSION_TYPE = "filesystem"
+    SESSION_TYPE = os.getenv("SESSION_TYPE", "sqlite").lower()
+    SESSION_SQLITE_PATH = os.getenv(
+        "SESSION_SQLITE_PATH", os.path.join(_basedir, "data", "sessions.db")
+    )
+    SESSION_CLEANUP_N_REQUESTS = int(os.getenv("SESSION_CLEANUP_N_REQUESTS", "100"))
+    SESSION_CLEANUP_BATCH_SIZE = int(os.getenv("SESSION_CLEANUP_BATCH_SIZE", "500"))
     SESSION_FILE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "flask_sessions")
     SESSION_FILE_THRESHOLD = 100
     SESSION_PERMANENT = False
@@ -45,3 +50,55 @@ class Config:
     LOGIN_RATE_WINDOW = int(os.getenv("LOGIN_RATE_WINDOW", "60"))
     LOGIN_FAIL_LIMIT = int(os.getenv("LOGIN_FAIL_LIMIT", "5"))
     LOGIN_LOCKOUT_SECONDS = int(os.getenv("LOGIN_LOCKOUT_SECONDS", "600"))
+
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_ALLOWED_IPS = [
+        value.strip()
+        for value in os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",")
+        if value.strip()
+    ]
+
+    STATIC_FINGERPRINT = (
+        os.getenv("STATIC_FINGERPRINT", "true" if IS_PRODUCTION else "false").lower()
+        == "true"
+    )
+    STATIC_BUILD_DIR = os.getenv("STATIC_BUILD_DIR", os.path.join(_basedir, "data", "static"))
+
+    PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "false").lower() == "true"
+    PROFILE_SLOW_MS = int(os.getenv("PROFILE_SLOW_MS", "5000"))
+    PROFILE_INTERVAL_MS = int(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_HEADER = os.getenv("PROFILE_HEADER", "X-Profile")
+    PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(_basedir, "data", "profiles"))
+    PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+
+    # Photos are downscaled in the browser to this long edge before upload
+    # (0 disables). 2400px keeps a card at >= 300 dpi when it spans ~45% of
+    # the photo, which is more than detection and the PDF layout use.
+    IMG_UPLOAD_MAX_EDGE = int(os.getenv("IMG_UPLOAD_MAX_EDGE", "2400"))
+    IMG_UPLOAD_JPEG_QUALITY = int(os.getenv("IMG_UPLOAD_JPEG_QUALITY", "90"))
+    # Decoded-size budget per uploaded photo, checked from the header before
+    # decoding. Larger JPEGs are decoded at 1/2-1/8 scale; other formats are
+    # rejected. 24 MP is ~72 MB of BGR pixels.
+    IMG_MAX_INPUT_MEGAPIXELS = float(os.getenv("IMG_MAX_INPUT_MEGAPIXELS", "24"))
+    # Detected boxes overlapping a larger one above this IoU are dropped as
+    # duplicates before warping.
+    IMG_NMS_IOU = float(os.getenv("IMG_NMS_IOU", "0.5"))
+    IMG_PREVIEW_CACHE_DIR = os.getenv(
+        "IMG_PREVIEW_CACHE_DIR", os.path.join(_basedir, "data", "preview_cache")
+    )
+    IMG_PREVIEW_CACHE_MAX_AGE = int(os.getenv("IMG_PREVIEW_CACHE_MAX_AGE", "7200"))
+    # Preview/generate requests stop processing after this many seconds (0
+    # disables). Keep it below GUNICORN_TIMEOUT so the worker answers with a
+    # timeout instead of being killed.
+    IMG_PIPELINE_TIMEOUT = float(os.getenv("IMG_PIPELINE_TIMEOUT", "90"))
+    # Repeated /generate calls with the same Idempotency-Key (or the same
+    # payload) within this many seconds return the existing job.
+    IMG_IDEMPOTENCY_WINDOW = int(os.getenv("IMG_IDEMPOTENCY_WINDOW", "600"))
+    # `flask archive-old-jobs` moves PDFs older than ARCHIVE_AFTER_DAYS out of
+    # the database into segment files of about ARCHIVE_SEGMENT_MB in here.
+    ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(_basedir, "data", "archive"))
+    ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "20"))
+    ARCHIVE_SEGMENT_MB = int(os.getenv("ARCHIVE_SEGMENT_MB", "256"))
+    # `flask backup-db` writes here and keeps this many backups of each kind.
+    BACKUP_DIR = os.getenv("BACKUP_DIR", os.path.join(_basedir, "data", "backups"))
+    BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
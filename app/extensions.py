@@ -1,8 +1,9 @@
 from flask_login import LoginManager
-from flask_session import Session
 from flask_sqlalchemy import SQLAlchemy
 from flask_wtf import CSRFProtect
 
+from .sessions import SessionStore
+
 
 db = SQLAlchemy()
 login_manager = LoginManager()
@@ -10,4 +11,4 @@ login_manager.login_view = "auth.login"
 login_manager.login_message = "Inicia sesion para continuar."
 login_manager.login_message_category = "error"
 csrf = CSRFProtect()
-session_store = Session()
+session_store = SessionStore()
@@ -0,0 +1,172 @@
+"""Prometheus metrics shared by every gunicorn worker.
+
+When ``PROMETHEUS_MULTIPROC_DIR`` is set (see ``gunicorn.conf.py``) each worker
+writes its samples to mmap files in that directory and ``/metrics`` merges
+them, so a scrape sees the whole deployment rather than one worker.
+"""
+import ipaddress
+import os
+import time
+from contextlib import contextmanager
+
+from flask import Response, abort, current_app, g, has_request_context, request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+if _MULTIPROC_DIR:
+    os.makedirs(_MULTIPROC_DIR, exist_ok=True)
+
+from prometheus_client import (  # noqa: E402  (must follow the env check above)
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+
+_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+_PIPELINE_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+
+REQUEST_LATENCY = Histogram(
+    "quatro_http_request_duration_seconds",
+    "Request latency by route.",
+    ["endpoint", "method", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    "quatro_db_queries_per_request",
+    "SQL statements executed per request.",
+    ["endpoint"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55),
+)
+PREVIEW_DURATION = Histogram(
+    "quatro_img_preview_duration_seconds",
+    "Time spent extracting documents for a preview request.",
+    buckets=_PIPELINE_BUCKETS,
+)
+PDF_DURATION = Histogram(
+    "quatro_img_pdf_duration_seconds",
+    "Time spent composing the PDF for a generate request.",
+    buckets=_PIPELINE_BUCKETS,
+)
+INPUT_MEGAPIXELS = Histogram(
+    "quatro_img_input_megapixels",
+    "Decoded size of each uploaded photo.",
+    buckets=(0.5, 1, 2, 4, 8, 12, 16, 24, 48, 100),
+)
+DOCUMENTS_PER_FILE = Histogram(
+    "quatro_img_documents_per_file",
+    "Documents extracted from each uploaded photo.",
+    buckets=(0, 1, 2, 3, 4, 5, 6),
+)
+DETECTION_LEVEL = Counter(
+    "quatro_img_detection_level",
+    "Uploaded photos by the detection cascade level that produced the crops.",
+    ["level"],
+)
+SUPPRESSED_CANDIDATES = Counter(
+    "quatro_img_suppressed_candidates",
+    "Duplicate document candidates dropped by non-maximum suppression.",
+)
+PIPELINE_CANCELLED = Counter(
+    "quatro_img_pipeline_cancelled",
+    "Preview and generate requests stopped early, by deadline or client disconnect.",
+    ["endpoint", "reason"],
+)
+IDEMPOTENT_REPLAYS = Counter(
+    "quatro_img_generate_replays",
+    "Duplicate /generate requests answered with an existing job, by its final status.",
+    ["status"],
+)
+PDF_BYTES = Histogram(
+    "quatro_img_pdf_bytes",
+    "Size of each generated PDF.",
+    buckets=(100_000, 250_000, 500_000, 1_000_000, 2_000_000, 4_000_000, 8_000_000),
+)
+CV_IN_PROGRESS = Gauge(
+    "quatro_cv_requests_in_progress",
+    "Preview and generate requests currently running the CV pipeline.",
+    multiprocess_mode="livesum",
+)
+
+
+@contextmanager
+def track_cv(duration: Histogram):
+    """Count the block as an in-flight CV request and observe its duration."""
+    CV_IN_PROGRESS.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration.observe(time.perf_counter() - start)
+        CV_IN_PROGRESS.dec()
+
+
+def observe_preview_files(file_stats: list[dict]) -> None:
+    for item in file_stats:
+        INPUT_MEGAPIXELS.observe(item["megapixels"])
+        DOCUMENTS_PER_FILE.observe(item["documents"])
+        DETECTION_LEVEL.labels(item["detection_level"]).inc()
+        SUPPRESSED_CANDIDATES.inc(item["suppressed"])
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g._metrics_queries = g.get("_metrics_queries", 0) + 1
+
+
+def _client_allowed() -> bool:
+    # Use the socket peer, not X-Forwarded-For, so the allowlist cannot be spoofed.
+    peer = request.environ.get("werkzeug.proxy_fix.orig", {}).get(
+        "REMOTE_ADDR", request.remote_addr
+    )
+    allowed = current_app.config.get("METRICS_ALLOWED_IPS", ())
+    try:
+        addr = ipaddress.ip_address(peer or "")
+    except ValueError:
+        return False
+    return any(addr in ipaddress.ip_network(net, strict=False) for net in allowed)
+
+
+def metrics_view():
+    if not _client_allowed():
+        if not (current_user.is_authenticated and current_user.role == "admin"):
+            abort(404)
+
+    if _MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app) -> None:
+    if not app.config.get("METRICS_ENABLED"):
+        return
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+        g._metrics_queries = 0
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop("_metrics_start", None)
+        endpoint = request.endpoint or "unmatched"
+        if start is None or endpoint == "metrics":
+            return response
+        REQUEST_LATENCY.labels(endpoint, request.method, str(response.status_code)).observe(
+            time.perf_counter() - start
+        )
+        DB_QUERIES.labels(endpoint).observe(g.pop("_metrics_queries", 0))
+        return response
+
+    app.add_url_rule("/metrics", "metrics", metrics_view)
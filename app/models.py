@@ -51,6 +51,14 @@ class User(UserMixin, db.Model):
 
 
 class ImgToPdfJob(db.Model):
+    __table_args__ = (
+        # One job per (user, key): repeated /generate calls reuse it.
+        db.Index("ix_img_to_pdf_job_idempotency", "user_id", "idempotency_key", unique=True),
+        # History listings and the capacity report filter by date.
+        db.Index("ix_img_to_pdf_job_created_at", "created_at"),
+        db.Index("ix_img_to_pdf_job_workspace_created", "workspace_id", "created_at"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     workspace_id = db.Column(db.Integer, db.ForeignKey("workspace.id"), nullable=True)
@@ -60,7 +68,23 @@ class ImgToPdfJob(db.Model):
     status = db.Column(db.String(40), default="pending")
     pdf_filename = db.Column(db.String(255), nullable=True)
     pdf_data = deferred(db.Column(db.LargeBinary, nullable=True))
+    # Size of the PDF wherever it is stored, so listings never load the blob.
+    pdf_size = db.Column(db.Integer, nullable=True)
+    # Set once ``archive-old-jobs`` moved the PDF out of ``pdf_data``.
+    archive_segment = db.Column(db.String(32), nullable=True)
+    archive_offset = db.Column(db.BigInteger, nullable=True)
+    archive_length = db.Column(db.Integer, nullable=True)
+    archived_at = db.Column(db.DateTime, nullable=True)
+    # Telemetry of the run that produced the PDF, including its preview.
+    processing_ms = db.Column(db.Integer, nullable=True)
+    decode_ms = db.Column(db.Integer, nullable=True)
+    detect_ms = db.Column(db.Integer, nullable=True)
+    render_ms = db.Column(db.Integer, nullable=True)
+    pdf_ms = db.Column(db.Integer, nullable=True)
+    input_bytes = db.Column(db.Integer, nullable=True)
+    input_megapixels = db.Column(db.Float, nullable=True)
     error_message = db.Column(db.Text, nullable=True)
+    idempotency_key = db.Column(db.String(64), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
@@ -0,0 +1,191 @@
+"""Opt-in sampling profiler for slow requests.
+
+A single daemon thread per worker samples the stacks of in-flight request
+threads every ``PROFILE_INTERVAL_MS``. When a request ends slower than
+``PROFILE_SLOW_MS`` (or an admin sends the ``PROFILE_HEADER`` header), its
+samples are written as a collapsed-stack file, the format consumed by
+flamegraph.pl and speedscope.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app, g, request
+from flask_login import current_user
+
+
+logger = logging.getLogger(__name__)
+
+_FILE_SUFFIX = ".collapsed"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    parts = code.co_filename.replace("\\", "/").split("/")
+    return f"{'/'.join(parts[-2:])}:{code.co_name}:{code.co_firstlineno}"
+
+
+class _Sampler:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._active: dict[int, Counter] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self) -> None:
+        # Threads do not survive gunicorn's fork; start one per worker lazily.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="request-sampler", daemon=True)
+        self._thread.start()
+
+    def start(self, ident: int) -> None:
+        with self._lock:
+            self._active[ident] = Counter()
+        self._ensure_thread()
+        self._wakeup.set()
+
+    def stop(self, ident: int) -> Counter:
+        with self._lock:
+            return self._active.pop(ident, Counter())
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                idle = not self._active
+            if idle:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, samples in self._active.items():
+                    frame = frames.get(ident)
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frame_label(frame))
+                        frame = frame.f_back
+                    if stack:
+                        samples[";".join(reversed(stack))] += 1
+
+
+def _write_profile(directory: str, max_files: int, meta: dict, samples: Counter) -> None:
+    os.makedirs(directory, exist_ok=True)
+    endpoint = re.sub(r"[^A-Za-z0-9._-]+", "_", meta["endpoint"])
+    name = (
+        f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}_{endpoint}_"
+        f"{meta['duration_ms']}ms{_FILE_SUFFIX}"
+    )
+    with open(os.path.join(directory, name), "w", encoding="utf-8") as fh:
+        for key in ("method", "path", "endpoint", "status", "duration_ms", "user"):
+            fh.write(f"# {key}: {meta[key]}\n")
+        for stack, count in samples.most_common():
+            fh.write(f"{stack} {count}\n")
+
+    profiles = sorted(f for f in os.listdir(directory) if f.endswith(_FILE_SUFFIX))
+    for stale in profiles[:-max_files] if max_files > 0 else []:
+        try:
+            os.remove(os.path.join(directory, stale))
+        except OSError:
+            pass
+
+
+def read_profile(path: str, top: int = 8) -> dict:
+    """Parse a collapsed-stack file into its metadata and hottest leaf frames."""
+    name = os.path.basename(path)
+    meta: dict = {"name": name}
+    try:
+        meta["created_at"] = datetime.strptime(name.split("_", 1)[0], "%Y%m%dT%H%M%S%f")
+    except ValueError:
+        meta["created_at"] = None
+    leaves: Counter = Counter()
+    total = 0
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.rstrip("\n")
+            if line.startswith("# "):
+                key, _, value = line[2:].partition(": ")
+                meta[key] = value
+                continue
+            stack, _, count = line.rpartition(" ")
+            if not stack:
+                continue
+            total += int(count)
+            leaves[stack.rsplit(";", 1)[-1]] += int(count)
+    meta["samples"] = total
+    meta["top_frames"] = [
+        {"frame": frame, "percent": round(100.0 * count / total, 1)}
+        for frame, count in leaves.most_common(top)
+    ] if total else []
+    return meta
+
+
+def list_profiles(directory: str, limit: int = 20) -> list[dict]:
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(
+        (f for f in os.listdir(directory) if f.endswith(_FILE_SUFFIX)), reverse=True
+    )[:limit]
+    profiles = []
+    for name in names:
+        try:
+            profiles.append(read_profile(os.path.join(directory, name)))
+        except (OSError, ValueError):
+            logger.warning("Profile %s could not be read", name)
+    return profiles
+
+
+def init_app(app) -> None:
+    if not app.config.get("PROFILE_ENABLED"):
+        return
+
+    sampler = _Sampler(interval=max(1, app.config["PROFILE_INTERVAL_MS"]) / 1000.0)
+
+    @app.before_request
+    def _start_sampling():
+        if request.endpoint == "static":
+            return
+        g._profile_start = time.perf_counter()
+        sampler.start(threading.get_ident())
+
+    @app.after_request
+    def _remember_status(response):
+        g._profile_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _finish_sampling(exc):
+        start = g.pop("_profile_start", None)
+        if start is None:
+            return
+        samples = sampler.stop(threading.get_ident())
+        duration_ms = int((time.perf_counter() - start) * 1000)
+
+        config = current_app.config
+        forced = bool(request.headers.get(config["PROFILE_HEADER"])) and (
+            current_user.is_authenticated and current_user.role == "admin"
+        )
+        if not samples or (duration_ms < config["PROFILE_SLOW_MS"] and not forced):
+            return
+
+        meta = {
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint or "unmatched",
+            "status": g.pop("_profile_status", 500),
+            "duration_ms": duration_ms,
+            "user": current_user.username if current_user.is_authenticated else "-",
+        }
+        try:
+            _write_profile(config["PROFILE_DIR"], config["PROFILE_MAX_FILES"], meta, samples)
+        except OSError:
+            logger.exception("Could not write request profile")
@@ -1,27 +1,36 @@
+import hashlib
 import io
+import json
 import logging
 import re
 import secrets
+import time
 import traceback
+import zlib
 
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from flask import (
     Blueprint,
+    Response,
+    abort,
     flash,
     jsonify,
     redirect,
     render_template,
     request,
     send_file,
+    send_from_directory,
+    stream_with_context,
     url_for,
 )
 from flask import current_app
 from flask_login import current_user, login_required
+from sqlalchemy.exc import IntegrityError
 
+from . import metrics, profiling
 from .extensions import db
 from .models import ImgToPdfJob, User, Workspace
-from .services.img_to_pdf import build_previews, create_pdf_from_data_urls
 
 
 logger = logging.getLogger(__name__)
@@ -53,6 +62,13 @@ def _format_img_pdf_error(exc: Exception) -> str:
         return "No se pudo leer una de las imagenes. Verifica el formato."
     if "No se recibieron imágenes" in detail or "No se recibieron imagenes" in detail:
         return "No se recibieron imagenes validas para generar el PDF."
+    if "La previsualizacion expiro" in detail:
+        return detail
+    if any(
+        text in detail
+        for text in ("Recorte invalido", "Rotacion invalida", "Cuadrilatero invalido", "edicion invalida")
+    ):
+        return "Una de las ediciones no es valida. Restablece el recorte e intenta nuevamente."
     if "No se pudo codificar la imagen" in detail:
         return "No se pudo procesar una imagen. Intenta con otra foto."
     return "No se pudo generar el PDF. Intenta nuevamente."
@@ -94,6 +110,41 @@ def _render_img_job_row(job):
     return render_template("partials/img_to_pdf_rows.html", jobs=[job])
 
 
+def _preview_cache_dir() -> str:
+    """Preview cache for this request, after sweeping the user's stale files."""
+    from .services.img_pdf import preview_store
+
+    cache_dir = current_app.config["IMG_PREVIEW_CACHE_DIR"]
+    preview_store.cleanup(
+        cache_dir, current_app.config["IMG_PREVIEW_CACHE_MAX_AGE"], owner=current_user.id
+    )
+    return cache_dir
+
+
+def _pipeline_cancel_token():
+    """Deadline for this request plus, under gunicorn, a client-disconnect probe.
+
+    Nginx closes the upstream connection when the browser goes away or its own
+    read timeout fires, so a closed socket means nobody will read the answer.
+    """
+    from .services.img_pdf.cancellation import CancelToken, socket_closed
+
+    sock = request.environ.get("gunicorn.socket")
+    probe = (lambda: socket_closed(sock)) if sock is not None else None
+    return CancelToken(current_app.config["IMG_PIPELINE_TIMEOUT"], probe)
+
+
+def _cancelled_response(exc, endpoint: str, **extra):
+    from .services.img_pdf.cancellation import DISCONNECTED
+
+    metrics.PIPELINE_CANCELLED.labels(endpoint, exc.reason).inc()
+    logger.info("%s cancelled at %s: %s", endpoint, exc.stage, exc.reason)
+    if exc.reason == DISCONNECTED:
+        # Nobody is listening; 499 is nginx's "client closed request".
+        return Response(status=499)
+    return jsonify({"error": str(exc), **extra}), 504
+
+
 @main.route("/tools/img-to-pdf/preview", methods=["POST"])
 @login_required
 def img_to_pdf_preview():
@@ -101,28 +152,224 @@ def img_to_pdf_preview():
     if not files:
         return jsonify({"error": "Debes subir al menos una imagen."}), 400
 
+    # The CV stack (cv2, numpy, PIL) is imported on first use so CLI commands
+    # and non-image routes do not pay for it.
+    from .services.img_pdf.cancellation import PipelineCancelled
+    from .services.img_to_pdf import build_previews
+
     enhance_mode = request.form.get("enhance_mode", "soft")
     file_keys = request.form.getlist("file_keys") or None
+    cache_dir = _preview_cache_dir()
+    file_stats: list[dict] = []
     try:
-        previews = build_previews(files, enhance_mode=enhance_mode, file_keys=file_keys)
+        with metrics.track_cv(metrics.PREVIEW_DURATION):
+            previews = build_previews(
+                files,
+                enhance_mode=enhance_mode,
+                file_keys=file_keys,
+                file_stats=file_stats,
+                cache_dir=cache_dir,
+                owner=current_user.id,
+                max_megapixels=current_app.config["IMG_MAX_INPUT_MEGAPIXELS"],
+                nms_iou=current_app.config["IMG_NMS_IOU"],
+                cancel=_pipeline_cancel_token(),
+            )
+    except PipelineCancelled as exc:
+        return _cancelled_response(exc, "preview", previews=exc.partial, partial=True)
     except ValueError as exc:
         return jsonify({"error": str(exc)}), 400
     except Exception:
         return jsonify({"error": "No se pudo procesar las imagenes."}), 500
+    finally:
+        metrics.observe_preview_files(file_stats)
 
     return jsonify({"previews": previews})
 
 
+@main.route("/tools/img-to-pdf/preview/stream", methods=["POST"])
+@login_required
+def img_to_pdf_preview_stream():
+    """Same as the preview route, but as NDJSON: one line per source/document.
+
+    Errors after the response started are sent as a final ``{"type": "error"}``
+    line, since the status code has already gone out. A deadline hit ends the
+    stream the same way (with ``"reason": "deadline"``), keeping the documents
+    already sent; a client disconnect just stops the pipeline.
+    """
+    files = request.files.getlist("images")
+    if not files:
+        return jsonify({"error": "Debes subir al menos una imagen."}), 400
+
+    from .services.img_pdf.cancellation import DISCONNECTED, PipelineCancelled
+    from .services.img_to_pdf import iter_previews
+
+    enhance_mode = request.form.get("enhance_mode", "soft")
+    file_keys = request.form.getlist("file_keys") or None
+    cache_dir = _preview_cache_dir()
+    owner = current_user.id
+    max_megapixels = current_app.config["IMG_MAX_INPUT_MEGAPIXELS"]
+    nms_iou = current_app.config["IMG_NMS_IOU"]
+    cancel = _pipeline_cancel_token()
+
+    def generate():
+        file_stats: list[dict] = []
+        documents = 0
+        try:
+            with metrics.track_cv(metrics.PREVIEW_DURATION):
+                for event in iter_previews(
+                    files,
+                    enhance_mode=enhance_mode,
+                    file_keys=file_keys,
+                    file_stats=file_stats,
+                    cache_dir=cache_dir,
+                    owner=owner,
+                    max_megapixels=max_megapixels,
+                    nms_iou=nms_iou,
+                    cancel=cancel,
+                ):
+                    if event["type"] == "document":
+                        documents += 1
+                    yield json.dumps(event) + "\n"
+        except PipelineCancelled as exc:
+            metrics.PIPELINE_CANCELLED.labels("preview_stream", exc.reason).inc()
+            logger.info("preview_stream cancelled at %s: %s", exc.stage, exc.reason)
+            if exc.reason != DISCONNECTED:
+                line = {"type": "error", "error": str(exc), "reason": exc.reason}
+                yield json.dumps({**line, "documents": documents}) + "\n"
+            return
+        except ValueError as exc:
+            yield json.dumps({"type": "error", "error": str(exc)}) + "\n"
+            return
+        except Exception:
+            logger.exception("Streaming preview failed")
+            yield json.dumps(
+                {"type": "error", "error": "No se pudo procesar las imagenes."}
+            ) + "\n"
+            return
+        finally:
+            metrics.observe_preview_files(file_stats)
+        yield json.dumps({"type": "done", "documents": documents}) + "\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        # Let nginx pass each line through instead of buffering the response.
+        headers={"X-Accel-Buffering": "no", "Cache-Control": "no-store"},
+    )
+
+
+_IDEMPOTENCY_KEY_RE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+def _idempotency_key(payload: dict) -> str:
+    """The client's ``Idempotency-Key`` header, or a hash of the payload."""
+    header = request.headers.get("Idempotency-Key", "").strip()
+    if _IDEMPOTENCY_KEY_RE.match(header):
+        return header
+    body = json.dumps(
+        {name: payload.get(name) for name in ("documents", "images", "filename")},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def _claim_generate_job(key: str, filename: str):
+    """Return ``(job, created)``: a new "processing" job holding ``key``, or the
+    job that already holds it.
+
+    Failed jobs, jobs older than IMG_IDEMPOTENCY_WINDOW and jobs stuck in
+    "processing" (their worker died) release the key so the PDF is rendered
+    again. The unique index settles concurrent claims.
+    """
+    window = current_app.config["IMG_IDEMPOTENCY_WINDOW"]
+    stuck_after = (current_app.config["IMG_PIPELINE_TIMEOUT"] or window) + 30
+    for _ in range(3):
+        existing = ImgToPdfJob.query.filter_by(
+            user_id=current_user.id, idempotency_key=key
+        ).first()
+        if existing is not None:
+            age = (datetime.utcnow() - existing.created_at).total_seconds()
+            stuck = existing.status == "processing" and age > stuck_after
+            if existing.status != "error" and age <= window and not stuck:
+                return existing, False
+            existing.idempotency_key = None
+            db.session.commit()
+
+        job = ImgToPdfJob(
+            user_id=current_user.id,
+            workspace_id=current_user.workspace_id,
+            created_by_user_id=current_user.id,
+            filename=filename,
+            status="processing",
+            page_count=0,
+            idempotency_key=key,
+        )
+        db.session.add(job)
+        try:
+            db.session.commit()
+            return job, True
+        except IntegrityError:
+            # A concurrent duplicate claimed the key first; wait on its job.
+            db.session.rollback()
+    raise RuntimeError("No se pudo reservar el trabajo de generacion.")
+
+
+def _record_job_telemetry(job, telemetry: dict) -> None:
+    """Store the per-stage milliseconds and input size gathered for ``job``."""
+    from .services.img_to_pdf import TELEMETRY_TIMINGS
+
+    for name in TELEMETRY_TIMINGS:
+        setattr(job, name, round(telemetry.get(name, 0)))
+    job.processing_ms = sum(getattr(job, name) for name in TELEMETRY_TIMINGS)
+    job.input_bytes = int(telemetry.get("input_bytes", 0))
+    job.input_megapixels = round(telemetry.get("input_megapixels", 0.0), 2)
+
+
+def _replay_generate_job(job):
+    """Answer a duplicate /generate with the outcome of ``job``.
+
+    An in-flight job is polled until it finishes (it may be rendering in
+    another worker), for at most IMG_PIPELINE_TIMEOUT seconds.
+    """
+    timeout = current_app.config["IMG_PIPELINE_TIMEOUT"] or current_app.config[
+        "IMG_IDEMPOTENCY_WINDOW"
+    ]
+    deadline = time.monotonic() + timeout
+    while job.status == "processing" and time.monotonic() < deadline:
+        time.sleep(0.25)
+        # End the read transaction so the other worker's commit is visible.
+        db.session.rollback()
+        db.session.refresh(job)
+
+    metrics.IDEMPOTENT_REPLAYS.labels(job.status).inc()
+    if job.status == "processing":
+        message = "Este PDF todavia se esta generando. Intenta en unos segundos."
+        return jsonify({"error": message}), 409
+    if job.status == "error":
+        return jsonify({"error": job.error_message}), 500
+    row_html = _render_img_job_row(job)
+    return jsonify(
+        {"job_id": job.id, "row_html": row_html, "status": job.status, "replayed": True}
+    )
+
+
 @main.route("/tools/img-to-pdf/generate", methods=["POST"])
 @login_required
 def img_to_pdf_generate():
     payload = request.get_json(silent=True) or {}
+    # "documents" carries preview tokens plus edit operations; "images" (data
+    # URLs) is still accepted from older clients.
+    documents = payload.get("documents") or []
     images = payload.get("images") or []
     filename = payload.get("filename") or ""
 
-    if not images:
+    if not documents and not images:
         return jsonify({"error": "No se recibieron imagenes para generar el PDF."}), 400
 
+    from .services.img_pdf.cancellation import PipelineCancelled
+    from .services.img_to_pdf import create_pdf_from_data_urls, create_pdf_from_documents
+
     safe_name = _safe_filename(filename) if filename else ""
     if safe_name:
         if not safe_name.lower().endswith(".pdf"):
@@ -130,25 +377,40 @@ def img_to_pdf_generate():
     else:
         safe_name = f"imagenes_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.pdf"
 
-    job = ImgToPdfJob(
-        user_id=current_user.id,
-        workspace_id=current_user.workspace_id,
-        created_by_user_id=current_user.id,
-        filename=safe_name,
-        status="processing",
-        page_count=0,
-    )
-    db.session.add(job)
-    db.session.commit()
+    job, created = _claim_generate_job(_idempotency_key(payload), safe_name)
+    if not created:
+        return _replay_generate_job(job)
 
+    cancel = _pipeline_cancel_token()
+    telemetry: dict = {}
     try:
-        pdf_bytes, page_count = create_pdf_from_data_urls(images)
+        with metrics.track_cv(metrics.PDF_DURATION):
+            if documents:
+                pdf_bytes, page_count = create_pdf_from_documents(
+                    documents,
+                    current_app.config["IMG_PREVIEW_CACHE_DIR"],
+                    current_user.id,
+                    cancel=cancel,
+                    telemetry=telemetry,
+                )
+            else:
+                pdf_bytes, page_count = create_pdf_from_data_urls(
+                    images, cancel=cancel, telemetry=telemetry
+                )
+        metrics.PDF_BYTES.observe(len(pdf_bytes))
+        _record_job_telemetry(job, telemetry)
         job.pdf_data = pdf_bytes
+        job.pdf_size = len(pdf_bytes)
         job.page_count = page_count
         job.pdf_filename = safe_name
         job.status = "done"
         job.error_message = None
         db.session.commit()
+    except PipelineCancelled as exc:
+        job.status = "error"
+        job.error_message = str(exc)
+        db.session.commit()
+        return _cancelled_response(exc, "generate")
     except Exception as exc:
         logger.error("IMG_to_PDF generation failed: %s", traceback.format_exc())
         job.status = "error"
@@ -187,24 +449,123 @@ def img_to_pdf_table():
     })
 
 
-@main.route("/tools/img-to-pdf/<int:job_id>/download")
-@login_required
-def img_to_pdf_download(job_id):
+def _job_pdf_or_none(job_id):
+    """Return ``(job, pdf_bytes)`` for the workspace's job, reading archived PDFs
+    from their segment; ``pdf_bytes`` is None when there is nothing to serve."""
+    from .services.pdf_archive import read_job_pdf
+
     job = ImgToPdfJob.query.filter_by(
         id=job_id, workspace_id=current_user.workspace_id
     ).first()
-    if not job or not job.pdf_data:
+    if not job:
+        return None, None
+    try:
+        return job, read_job_pdf(job, current_app.config["ARCHIVE_DIR"])
+    except (OSError, ValueError, zlib.error):
+        logger.error("Archived PDF for job %s unreadable: %s", job.id, traceback.format_exc())
+        return job, None
+
+
+@main.route("/tools/img-to-pdf/<int:job_id>/download")
+@login_required
+def img_to_pdf_download(job_id):
+    job, pdf_bytes = _job_pdf_or_none(job_id)
+    if not pdf_bytes:
         flash("El PDF aun no esta disponible.", "error")
         return redirect(url_for("main.img_to_pdf"))
 
     return send_file(
-        io.BytesIO(job.pdf_data),
+        io.BytesIO(pdf_bytes),
         mimetype="application/pdf",
         download_name=job.pdf_filename or job.filename,
         as_attachment=True,
     )
 
 
+def _parse_export_date(value: str):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
+
+@main.route("/tools/img-to-pdf/export")
+@login_required
+def img_to_pdf_export():
+    """Stream the workspace's finished PDFs as one ZIP.
+
+    Select jobs with ``ids`` (repeated or comma separated) or with a
+    ``from``/``to`` date range (YYYY-MM-DD, inclusive, UTC creation date).
+    """
+    from .services.job_export import iter_zip
+    from .services.pdf_archive import read_pdf
+
+    query = db.session.query(
+        ImgToPdfJob.id,
+        ImgToPdfJob.pdf_filename,
+        ImgToPdfJob.filename,
+        ImgToPdfJob.created_at,
+        ImgToPdfJob.archive_segment,
+        ImgToPdfJob.archive_offset,
+        ImgToPdfJob.archive_length,
+    ).filter(
+        ImgToPdfJob.workspace_id == current_user.workspace_id,
+        ImgToPdfJob.status == "done",
+        ImgToPdfJob.pdf_size.isnot(None),
+    )
+
+    raw_ids = ",".join(request.args.getlist("ids"))
+    if raw_ids:
+        try:
+            ids = {int(value) for value in raw_ids.split(",") if value.strip()}
+        except ValueError:
+            flash("La lista de registros no es valida.", "error")
+            return redirect(url_for("main.img_to_pdf"))
+        query = query.filter(ImgToPdfJob.id.in_(ids))
+        label = "seleccion"
+    else:
+        start = _parse_export_date(request.args.get("from"))
+        end = _parse_export_date(request.args.get("to"))
+        if not start or not end or end < start:
+            flash("Indica un rango de fechas valido para exportar.", "error")
+            return redirect(url_for("main.img_to_pdf"))
+        query = query.filter(
+            ImgToPdfJob.created_at >= start, ImgToPdfJob.created_at < end + timedelta(days=1)
+        )
+        label = f"{start:%Y%m%d}_{end:%Y%m%d}"
+
+    # Only ids and names are listed up front; each PDF is loaded on its own
+    # while the archive streams, so memory does not grow with the selection.
+    rows = query.order_by(ImgToPdfJob.created_at).all()
+    if not rows:
+        flash("No hay PDFs para exportar con ese filtro.", "error")
+        return redirect(url_for("main.img_to_pdf"))
+
+    archive_dir = current_app.config["ARCHIVE_DIR"]
+
+    def entries():
+        for job_id, pdf_filename, filename, created_at, segment, offset, length in rows:
+            if segment:
+                data = read_pdf(archive_dir, segment, offset, length)
+            else:
+                data = (
+                    db.session.query(ImgToPdfJob.pdf_data).filter(ImgToPdfJob.id == job_id).scalar()
+                )
+            if data:
+                name = _safe_filename(pdf_filename or filename) or f"{job_id}.pdf"
+                yield name, created_at, data
+
+    return Response(
+        stream_with_context(iter_zip(entries())),
+        mimetype="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="pdfs_{label}.zip"',
+            "X-Accel-Buffering": "no",
+            "Cache-Control": "no-store",
+        },
+    )
+
+
 @main.route("/tools/img-to-pdf/<int:job_id>/delete", methods=["POST"])
 @login_required
 def img_to_pdf_delete(job_id):
@@ -221,15 +582,13 @@ def img_to_pdf_delete(job_id):
 @main.route("/tools/img-to-pdf/<int:job_id>/view")
 @login_required
 def img_to_pdf_view(job_id):
-    job = ImgToPdfJob.query.filter_by(
-        id=job_id, workspace_id=current_user.workspace_id
-    ).first()
-    if not job or not job.pdf_data:
+    job, pdf_bytes = _job_pdf_or_none(job_id)
+    if not pdf_bytes:
         flash("El PDF aun no esta disponible.", "error")
         return redirect(url_for("main.img_to_pdf"))
 
     return send_file(
-        io.BytesIO(job.pdf_data),
+        io.BytesIO(pdf_bytes),
         mimetype="application/pdf",
         download_name=job.pdf_filename or job.filename,
         as_attachment=False,
@@ -376,3 +735,56 @@ def control_panel():
         "control_panel.html",
         users=users,
     )
+
+
+@main.route("/control-panel/capacity")
+@login_required
+def control_panel_capacity():
+    guard = _require_admin()
+    if guard:
+        return guard
+
+    from .services.capacity import capacity_report
+
+    days = min(max(request.args.get("days", 14, type=int), 1), 90)
+    workspaces = {workspace.id: workspace.name for workspace in Workspace.query.all()}
+    return render_template(
+        "control_panel_capacity.html",
+        days=days,
+        by_day=capacity_report(db.session, days, "day"),
+        by_workspace=capacity_report(db.session, days, "workspace"),
+        workspaces=workspaces,
+    )
+
+
+@main.route("/control-panel/profiles")
+@login_required
+def control_panel_profiles():
+    guard = _require_admin()
+    if guard:
+        return guard
+
+    return render_template(
+        "control_panel_profiles.html",
+        profiling_enabled=current_app.config.get("PROFILE_ENABLED", False),
+        slow_ms=current_app.config.get("PROFILE_SLOW_MS"),
+        profile_header=current_app.config.get("PROFILE_HEADER"),
+        profiles=profiling.list_profiles(current_app.config["PROFILE_DIR"]),
+    )
+
+
+@main.route("/control-panel/profiles/<path:name>")
+@login_required
+def control_panel_profile_download(name):
+    guard = _require_admin()
+    if guard:
+        return guard
+    if not name.endswith(".collapsed"):
+        abort(404)
+
+    return send_from_directory(
+        current_app.config["PROFILE_DIR"],
+        name,
+        mimetype="text/plain",
+        as_attachment=True,
+    )
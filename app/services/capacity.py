@@ -0,0 +1,73 @@
+"""Capacity report over the telemetry stored on each job.
+
+Percentiles are nearest-rank, computed by SQLite with window functions over
+the jobs of the period; ``ix_img_to_pdf_job_created_at`` bounds the scan to
+that period, so the report costs the same however long the history is.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, bindparam, text
+
+
+# What a report row is grouped by.
+_GROUP_KEYS = {
+    "day": "date(created_at)",
+    "workspace": "coalesce(workspace_id, 0)",
+}
+
+_REPORT_SQL = """
+WITH runs AS (
+    SELECT
+        {key} AS grp,
+        processing_ms,
+        decode_ms,
+        detect_ms,
+        render_ms,
+        pdf_ms,
+        input_bytes,
+        input_megapixels,
+        pdf_size,
+        COUNT(*) OVER per_group AS n,
+        ROW_NUMBER() OVER (per_group ORDER BY processing_ms) AS rank_ms,
+        ROW_NUMBER() OVER (per_group ORDER BY input_megapixels) AS rank_mp
+    FROM img_to_pdf_job
+    WHERE created_at >= :since AND processing_ms IS NOT NULL
+    WINDOW per_group AS (PARTITION BY {key})
+)
+SELECT
+    grp,
+    MAX(n) AS jobs,
+    MIN(CASE WHEN rank_ms >= 0.50 * n THEN processing_ms END) AS p50_ms,
+    MIN(CASE WHEN rank_ms >= 0.95 * n THEN processing_ms END) AS p95_ms,
+    MAX(processing_ms) AS max_ms,
+    AVG(decode_ms) AS decode_ms,
+    AVG(detect_ms) AS detect_ms,
+    AVG(render_ms) AS render_ms,
+    AVG(pdf_ms) AS pdf_ms,
+    MIN(CASE WHEN rank_mp >= 0.95 * n THEN input_megapixels END) AS p95_megapixels,
+    MAX(input_megapixels) AS max_megapixels,
+    AVG(input_bytes) AS input_bytes,
+    AVG(pdf_size) AS pdf_bytes
+FROM runs
+GROUP BY grp
+"""
+
+
+def capacity_report(session, days: int, group: str) -> list[dict]:
+    """Per-``group`` ("day" or "workspace") timings of the last ``days`` days.
+
+    Only jobs with telemetry are counted. Days come newest first, workspaces
+    slowest (p95) first.
+    """
+    since = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    since -= timedelta(days=days - 1)
+    query = text(_REPORT_SQL.format(key=_GROUP_KEYS[group])).bindparams(
+        bindparam("since", type_=DateTime)
+    )
+    rows = session.execute(query, {"since": since}).mappings()
+    report = [dict(row) for row in rows]
+    if group == "day":
+        report.sort(key=lambda row: row["grp"], reverse=True)
+    else:
+        report.sort(key=lambda row: row["p95_ms"] or 0, reverse=True)
+    return report
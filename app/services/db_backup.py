@@ -0,0 +1,188 @@
+"""Online backups of the SQLite database while the app keeps writing.
+
+Full backups use SQLite's online backup API a few pages at a time with a
+pause between steps: each step only holds a read lock for as long as it takes
+to copy its pages, so writers wait milliseconds at most. A write from another
+connection makes SQLite restart the copy; after a restart the step size is
+doubled, and past ``MAX_RESTARTS`` the rest is copied in a single step so a
+busy database still gets backed up.
+
+Metadata-only backups (``skip_blobs``) copy every table in one read
+transaction with BLOB columns emptied (NULL stays NULL, anything else becomes
+an empty blob), which is fast because the PDFs are never written out.
+
+Either way the copy is written next to the destination, gzip-compressed in
+chunks and renamed into place, and older backups beyond ``keep`` are removed.
+"""
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+
+BACKUP_SUFFIX = ".db.gz"
+METADATA_SUFFIX = ".meta.db.gz"
+STEP_PAGES = 512
+STEP_SLEEP = 0.02
+MAX_RESTARTS = 4
+_COPY_CHUNK = 1024 * 1024
+
+
+@dataclass
+class BackupResult:
+    path: str
+    source_bytes: int
+    backup_bytes: int
+    elapsed: float
+    steps: int = 0
+    restarts: int = 0
+    removed: int = 0
+
+
+class _Restarted(Exception):
+    pass
+
+
+def _online_copy(source: str, target: str, pages: int, sleep: float) -> tuple[int, int]:
+    """Copy ``source`` into ``target`` with the backup API; return (steps, restarts)."""
+    steps = 0
+    restarts = 0
+    while True:
+        last_remaining = None
+
+        def progress(status, remaining, total):
+            nonlocal steps, last_remaining
+            steps += 1
+            if last_remaining is not None and remaining > last_remaining:
+                raise _Restarted()
+            last_remaining = remaining
+
+        step_pages = -1 if restarts >= MAX_RESTARTS else pages * 2**restarts
+        src = sqlite3.connect(f"file:{source}?mode=ro", uri=True, timeout=30)
+        dst = sqlite3.connect(target)
+        try:
+            src.backup(dst, pages=step_pages, progress=progress, sleep=sleep)
+            return steps, restarts
+        except _Restarted:
+            restarts += 1
+        finally:
+            dst.close()
+            src.close()
+
+
+def _blob_columns(conn: sqlite3.Connection, table: str) -> set[str]:
+    return {
+        row[1]
+        for row in conn.execute(f'PRAGMA table_info("{table}")')
+        if "BLOB" in (row[2] or "").upper()
+    }
+
+
+def _metadata_copy(source: str, target: str) -> None:
+    """Copy every table of ``source`` into ``target`` with BLOB columns emptied."""
+    src = sqlite3.connect(f"file:{source}?mode=ro", uri=True, timeout=30, isolation_level=None)
+    try:
+        objects = src.execute(
+            "SELECT type, name, sql FROM sqlite_master "
+            "WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'"
+        ).fetchall()
+        tables = [(name, sql) for kind, name, sql in objects if kind == "table"]
+        dst = sqlite3.connect(target)
+        with dst:
+            for _, sql in tables:
+                dst.execute(sql)
+        dst.close()
+
+        src.execute("ATTACH DATABASE ? AS snapshot", (target,))
+        src.execute("BEGIN")
+        for name, _ in tables:
+            blobs = _blob_columns(src, name)
+            columns = [row[1] for row in src.execute(f'PRAGMA table_info("{name}")')]
+            select = ", ".join(
+                f"CASE WHEN \"{col}\" IS NULL THEN NULL ELSE X'' END" if col in blobs else f'"{col}"'
+                for col in columns
+            )
+            names = ", ".join(f'"{col}"' for col in columns)
+            src.execute(
+                f'INSERT INTO snapshot."{name}" ({names}) SELECT {select} FROM main."{name}"'
+            )
+        src.execute("COMMIT")
+        src.execute("DETACH DATABASE snapshot")
+    finally:
+        src.close()
+
+    # Indexes, views and triggers go in after the rows.
+    dst = sqlite3.connect(target)
+    with dst:
+        for kind, _, sql in objects:
+            if kind != "table":
+                dst.execute(sql)
+    dst.close()
+
+
+def _compress(path: str, target: str) -> None:
+    tmp_path = f"{target}.tmp"
+    with open(path, "rb") as src, gzip.open(tmp_path, "wb") as dst:
+        shutil.copyfileobj(src, dst, _COPY_CHUNK)
+    os.replace(tmp_path, target)
+
+
+def rotate(out_dir: str, prefix: str, suffix: str, keep: int) -> int:
+    """Delete all but the newest ``keep`` backups named ``<prefix>_*<suffix>``."""
+    names = sorted(
+        name
+        for name in os.listdir(out_dir)
+        if name.startswith(f"{prefix}_") and name.endswith(suffix)
+        # A full backup's suffix is also the end of a metadata one.
+        and (suffix == METADATA_SUFFIX or not name.endswith(METADATA_SUFFIX))
+    )
+    stale = names[:-keep] if keep > 0 else []
+    for name in stale:
+        os.remove(os.path.join(out_dir, name))
+    return len(stale)
+
+
+def backup_sqlite(
+    source: str,
+    out_dir: str,
+    keep: int = 7,
+    skip_blobs: bool = False,
+    pages: int = STEP_PAGES,
+    sleep: float = STEP_SLEEP,
+) -> BackupResult:
+    """Write a gzip backup of the SQLite file ``source`` into ``out_dir``."""
+    if not os.path.isfile(source):
+        raise ValueError(f"No existe la base de datos {source}.")
+    os.makedirs(out_dir, exist_ok=True)
+    prefix = os.path.splitext(os.path.basename(source))[0]
+    suffix = METADATA_SUFFIX if skip_blobs else BACKUP_SUFFIX
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    target = os.path.join(out_dir, f"{prefix}_{stamp}{suffix}")
+    # Uncompressed copy on the same disk as the backups, not in /tmp.
+    work_path = os.path.join(out_dir, f".{prefix}_{stamp}.db.tmp")
+
+    start = time.perf_counter()
+    steps = restarts = 0
+    try:
+        if skip_blobs:
+            _metadata_copy(source, work_path)
+        else:
+            steps, restarts = _online_copy(source, work_path, pages, sleep)
+        _compress(work_path, target)
+    finally:
+        for path in (work_path, f"{target}.tmp"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    return BackupResult(
+        path=target,
+        source_bytes=os.path.getsize(source),
+        backup_bytes=os.path.getsize(target),
+        elapsed=time.perf_counter() - start,
+        steps=steps,
+        restarts=restarts,
+        removed=rotate(out_dir, prefix, suffix, keep),
+    )
@@ -0,0 +1,228 @@
+"""Offline bulk conversion: a folder or ZIP of photos into 6-card PDFs.
+
+Photos are processed by a pool of worker processes (detection, warp and
+enhance are CPU bound and hold the GIL between OpenCV calls); the parent keeps
+the input order, packs each photo's documents into the current page and writes
+a PDF whenever the next photo would not fit. A photo's documents are never
+split across two PDFs, so progress can be recorded per photo: the state file
+in the output folder lists the finished inputs and the PDFs written, and a
+rerun skips them. Each PDF also gets a key so it can be registered as a job
+exactly once (see ``iter_unregistered``).
+"""
+import json
+import os
+import secrets
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import cv2
+
+from .img_pdf.image_decoder import decode_image
+from .img_pdf.image_processor import NMS_IOU, process_image_to_documents
+from .img_pdf.pdf_maker import create_single_page_pdf_bytes
+from .img_to_pdf import DOCUMENT_OUTPUT_SIZE, MAX_DOCS, MAX_INPUT_MEGAPIXELS, PDF_LAYOUT
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+STATE_FILENAME = ".img_to_pdf_batch.json"
+
+
+@dataclass
+class BatchResult:
+    images: int = 0
+    skipped: int = 0
+    documents: int = 0
+    pdfs: list[str] = field(default_factory=list)
+    failed: dict[str, str] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def images_per_second(self) -> float:
+        return self.images / self.elapsed if self.elapsed else 0.0
+
+
+def list_inputs(source: str) -> list[str]:
+    """Image keys under ``source``: relative paths in a folder or ZIP, sorted."""
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            names = [
+                info.filename
+                for info in archive.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+            ]
+        return sorted(names)
+    keys = []
+    for root, _, files in os.walk(source):
+        for name in files:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                keys.append(os.path.relpath(os.path.join(root, name), source))
+    return sorted(keys)
+
+
+def _read_input(source: str, key: str) -> bytes:
+    if os.path.isdir(source):
+        with open(os.path.join(source, key), "rb") as fh:
+            return fh.read()
+    with zipfile.ZipFile(source) as archive:
+        return archive.read(key)
+
+
+def _init_worker() -> None:
+    # One OpenCV thread per process: the pool already uses every core.
+    cv2.setNumThreads(1)
+
+
+def _process_input(task: tuple) -> tuple[str, list, str | None]:
+    source, key, enhance_mode, max_docs, max_megapixels, nms_iou = task
+    try:
+        image = decode_image(_read_input(source, key), max_megapixels=max_megapixels)
+        docs = process_image_to_documents(
+            image,
+            max_docs=max_docs,
+            enhance_mode=enhance_mode,
+            nms_iou=nms_iou,
+            output_size=DOCUMENT_OUTPUT_SIZE,
+        )
+    except Exception as exc:  # one bad photo must not stop the batch
+        return key, [], str(exc) or exc.__class__.__name__
+    return key, docs, None
+
+
+def load_state(out_dir: str, source: str, resume: bool = True) -> dict:
+    path = os.path.join(out_dir, STATE_FILENAME)
+    if resume and os.path.isfile(path):
+        with open(path, encoding="utf-8") as fh:
+            state = json.load(fh)
+        if state.get("source") != os.path.abspath(source):
+            raise ValueError(
+                f"{path} corresponde a otra entrada ({state.get('source')}). "
+                "Usa otra carpeta de salida o --no-resume."
+            )
+        return state
+    return {
+        "source": os.path.abspath(source),
+        "run_id": secrets.token_hex(4),
+        "done": [],
+        "failed": {},
+        "pdfs": [],
+    }
+
+
+def save_state(out_dir: str, state: dict) -> None:
+    path = os.path.join(out_dir, STATE_FILENAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(state, fh)
+    os.replace(tmp_path, path)
+
+
+def run_batch(
+    source: str,
+    out_dir: str,
+    workers: int | None = None,
+    enhance_mode: str = "soft",
+    per_pdf: int = MAX_DOCS,
+    prefix: str | None = None,
+    resume: bool = True,
+    progress=None,
+    max_megapixels: float = MAX_INPUT_MEGAPIXELS,
+    nms_iou: float = NMS_IOU,
+) -> BatchResult:
+    """Convert every photo under ``source`` into PDFs in ``out_dir``.
+
+    Photos already finished by a previous run with the same ``out_dir`` are
+    skipped unless ``resume`` is False. ``progress(result)`` is called after
+    each photo.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    state = load_state(out_dir, source, resume)
+    prefix = prefix or os.path.splitext(os.path.basename(os.path.normpath(source)))[0]
+    finished = set(state["done"]) | set(state["failed"])
+    keys = [key for key in list_inputs(source) if key not in finished]
+
+    result = BatchResult(skipped=len(finished))
+    start = time.perf_counter()
+    page_docs: list = []
+    page_keys: list[str] = []
+
+    def flush() -> None:
+        if not page_docs:
+            return
+        name = f"{prefix}_{len(state['pdfs']) + 1:04d}.pdf"
+        pdf_bytes = create_single_page_pdf_bytes(images_bgr=page_docs, **PDF_LAYOUT)
+        tmp_path = os.path.join(out_dir, f".{name}.tmp")
+        with open(tmp_path, "wb") as fh:
+            fh.write(pdf_bytes)
+        os.replace(tmp_path, os.path.join(out_dir, name))
+        state["pdfs"].append(
+            {
+                "name": name,
+                "key": f"batch-{state['run_id']}-{len(state['pdfs']) + 1:04d}",
+                "documents": len(page_docs),
+                "inputs": list(page_keys),
+                "registered": False,
+            }
+        )
+        state["done"].extend(page_keys)
+        save_state(out_dir, state)
+        result.pdfs.append(name)
+        page_docs.clear()
+        page_keys.clear()
+
+    workers = workers or os.cpu_count() or 1
+    tasks = iter(
+        (source, key, enhance_mode, per_pdf, max_megapixels, nms_iou) for key in keys
+    )
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        # A bounded window of in-flight photos keeps results in input order
+        # without queueing every decoded document in memory.
+        pending: deque = deque()
+        for task in tasks:
+            pending.append(pool.submit(_process_input, task))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            key, docs, error = pending.popleft().result()
+            next_task = next(tasks, None)
+            if next_task is not None:
+                pending.append(pool.submit(_process_input, next_task))
+
+            result.images += 1
+            if error:
+                result.failed[key] = error
+                state["failed"][key] = error
+                continue
+            if len(page_docs) + len(docs) > per_pdf:
+                flush()
+            page_docs.extend(docs)
+            page_keys.append(key)
+            result.documents += len(docs)
+            result.elapsed = time.perf_counter() - start
+            if progress is not None:
+                progress(result)
+    flush()
+    save_state(out_dir, state)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def iter_unregistered(out_dir: str, state: dict, batch_size: int = 20):
+    """Yield ``[(entry, pdf_bytes), ...]`` chunks of PDFs not yet registered.
+
+    The caller sets ``entry["registered"] = True`` and saves the state once a
+    chunk is stored.
+    """
+    chunk = []
+    for entry in state["pdfs"]:
+        if entry.get("registered"):
+            continue
+        with open(os.path.join(out_dir, entry["name"]), "rb") as fh:
+            chunk.append((entry, fh.read()))
+        if len(chunk) >= batch_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,84 @@
+"""Read photos out of an uploaded ZIP without extracting it.
+
+Entries are read one at a time from the (spooled) upload stream. The entry
+count is taken from the end-of-central-directory record before ``zipfile``
+parses the directory, and sizes are checked against the uncompressed sizes
+the directory declares; ``zipfile`` never returns more than that, so a
+highly compressed entry cannot expand past the limits.
+"""
+import os
+import struct
+import zipfile
+from typing import BinaryIO, Iterator
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+_EOCD_SIGNATURE = b"PK\x05\x06"
+_EOCD_SIZE = 22
+_MAX_COMMENT = 0xFFFF
+
+
+def _declared_entry_count(stream: BinaryIO) -> int:
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    tail_size = min(size, _EOCD_SIZE + _MAX_COMMENT)
+    stream.seek(size - tail_size)
+    tail = stream.read(tail_size)
+    pos = tail.rfind(_EOCD_SIGNATURE)
+    if pos < 0 or pos + _EOCD_SIZE > len(tail):
+        raise ValueError("El archivo ZIP esta danado.")
+    # Total entries in the central directory (0xFFFF means ZIP64: "too many").
+    (total,) = struct.unpack("<H", tail[pos + 10:pos + 12])
+    return total
+
+
+def _is_image_entry(info: zipfile.ZipInfo) -> bool:
+    name = info.filename
+    base = os.path.basename(name)
+    return (
+        not info.is_dir()
+        and name.lower().endswith(IMAGE_EXTENSIONS)
+        and not base.startswith(".")
+        and "__MACOSX/" not in name
+    )
+
+
+def iter_zip_images(
+    stream: BinaryIO, max_entries: int, max_entry_bytes: int, max_total_bytes: int
+) -> Iterator[tuple[str, bytes]]:
+    """Yield ``(name, data)`` for each image entry of the ZIP in ``stream``.
+
+    Raises ``ValueError`` for damaged archives, more than ``max_entries``
+    entries, an image over ``max_entry_bytes`` or images adding up to more
+    than ``max_total_bytes`` uncompressed.
+    """
+    try:
+        if _declared_entry_count(stream) > max_entries:
+            raise ValueError(f"El ZIP tiene demasiados archivos (maximo {max_entries}).")
+        stream.seek(0)
+        archive = zipfile.ZipFile(stream)
+    except (zipfile.BadZipFile, OSError, struct.error):
+        raise ValueError("El archivo ZIP esta danado.")
+
+    with archive:
+        entries = [info for info in archive.infolist() if _is_image_entry(info)]
+        if not entries:
+            raise ValueError("El ZIP no contiene imagenes JPG o PNG.")
+        total = 0
+        for info in sorted(entries, key=lambda item: item.filename):
+            if info.flag_bits & 0x1:
+                raise ValueError("El ZIP esta protegido con contrasena.")
+            if info.file_size > max_entry_bytes:
+                raise ValueError(
+                    f"{os.path.basename(info.filename)} excede {max_entry_bytes // (1024 * 1024)}MB."
+                )
+            total += info.file_size
+            if total > max_total_bytes:
+                raise ValueError(
+                    f"El contenido del ZIP excede {max_total_bytes // (1024 * 1024)}MB."
+                )
+            try:
+                data = archive.read(info)
+            except (zipfile.BadZipFile, NotImplementedError, OSError):
+                raise ValueError(f"No se pudo leer {os.path.basename(info.filename)} del ZIP.")
+            yield info.filename, data
@@ -0,0 +1,86 @@
+"""Cooperative cancellation for the image pipeline.
+
+A ``CancelToken`` is created per request and checked between files,
+documents and processing stages; once its deadline passes or the client is
+gone, ``check`` raises ``PipelineCancelled`` so the worker stops spending CPU
+on a response nobody will read. Kept free of the CV stack.
+"""
+import errno
+import socket
+import time
+from typing import Callable
+
+
+DEADLINE = "deadline"
+DISCONNECTED = "disconnected"
+
+_MESSAGES = {
+    DEADLINE: "Se alcanzo el tiempo maximo de procesamiento. Intenta con menos imagenes.",
+    DISCONNECTED: "El cliente cerro la conexion.",
+}
+
+
+class PipelineCancelled(Exception):
+    """The pipeline was stopped; ``reason`` is ``DEADLINE`` or ``DISCONNECTED``."""
+
+    def __init__(self, reason: str, stage: str = ""):
+        super().__init__(_MESSAGES[reason])
+        self.reason = reason
+        self.stage = stage
+        # Results finished before the stop, filled in by callers that have any.
+        self.partial: list = []
+
+
+class CancelToken:
+    """Deadline plus an optional disconnect probe, checked cooperatively.
+
+    ``timeout`` is in seconds from creation (``None`` or 0 disables it).
+    ``is_disconnected`` is polled at most every ``probe_interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        timeout: float | None = None,
+        is_disconnected: Callable[[], bool] | None = None,
+        probe_interval: float = 0.25,
+    ):
+        now = time.monotonic()
+        self.deadline = now + timeout if timeout else None
+        self._is_disconnected = is_disconnected
+        self._probe_interval = probe_interval
+        self._next_probe = now
+
+    def remaining(self) -> float | None:
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self, stage: str = "") -> None:
+        now = time.monotonic()
+        if self.deadline is not None and now >= self.deadline:
+            raise PipelineCancelled(DEADLINE, stage)
+        if self._is_disconnected is not None and now >= self._next_probe:
+            self._next_probe = now + self._probe_interval
+            if self._is_disconnected():
+                raise PipelineCancelled(DISCONNECTED, stage)
+
+
+def check(cancel: CancelToken | None, stage: str = "") -> None:
+    """``cancel.check(stage)`` that accepts ``None`` (no cancellation)."""
+    if cancel is not None:
+        cancel.check(stage)
+
+
+def socket_closed(sock: socket.socket) -> bool:
+    """Return True once the peer of ``sock`` has closed or reset the connection.
+
+    Peeks without blocking: a clean close reads as EOF, a reset as an error.
+    Pending bytes (a pipelined request) or nothing to read mean still open.
+    """
+    try:
+        data = sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+    except (BlockingIOError, InterruptedError):
+        return False
+    except OSError as exc:
+        return exc.errno not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+    return data == b""
@@ -0,0 +1,144 @@
+"""Decode uploaded photos straight into BGR arrays.
+
+``cv2.imdecode`` writes the pixels directly into the array the pipeline uses,
+and the EXIF orientation is read from the JPEG header and applied with
+``cv2.rotate``/``cv2.flip``. Pillow is only used for formats OpenCV cannot read.
+
+Dimensions are read from the header first so a small file cannot expand into
+gigabytes: JPEGs over the megapixel budget are decoded at 1/2, 1/4 or 1/8
+scale (libjpeg does this in the IDCT, the full frame is never allocated) and
+anything else over budget is rejected.
+"""
+import io
+import struct
+import warnings
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+
+_ORIENTATION_TAG = 0x0112
+_REDUCED_JPEG_FLAGS = (
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+)
+
+
+def read_dimensions(data: bytes) -> tuple[int, int, str]:
+    """Return ``(width, height, format)`` from the image header only."""
+    try:
+        with warnings.catch_warnings():
+            # The caller enforces its own (stricter) pixel budget.
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            with Image.open(io.BytesIO(data)) as image:
+                return image.width, image.height, image.format or ""
+    except Image.DecompressionBombError:
+        raise ValueError("La imagen es demasiado grande.")
+    except Exception as exc:
+        raise ValueError("No se pudo leer la imagen.") from exc
+
+
+def read_exif_orientation(data: bytes) -> int:
+    """Return the EXIF orientation (1-8) of a JPEG, or 1 when absent."""
+    if data[:2] != b"\xff\xd8":
+        return 1
+    pos = 2
+    size = len(data)
+    while pos + 4 <= size:
+        if data[pos] != 0xFF:
+            return 1
+        marker = data[pos + 1]
+        if marker in (0xD9, 0xDA):  # end of image / start of scan
+            return 1
+        if marker == 0xFF or 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            pos += 1 if marker == 0xFF else 2
+            continue
+        (length,) = struct.unpack(">H", data[pos + 2:pos + 4])
+        segment = data[pos + 4:pos + 2 + length]
+        if marker == 0xE1 and segment[:6] == b"Exif\x00\x00":
+            return _orientation_from_tiff(segment[6:])
+        pos += 2 + length
+    return 1
+
+
+def _orientation_from_tiff(tiff: bytes) -> int:
+    if tiff[:2] == b"II":
+        endian = "<"
+    elif tiff[:2] == b"MM":
+        endian = ">"
+    else:
+        return 1
+    try:
+        (ifd_offset,) = struct.unpack(endian + "I", tiff[4:8])
+        (count,) = struct.unpack(endian + "H", tiff[ifd_offset:ifd_offset + 2])
+        for index in range(count):
+            entry = ifd_offset + 2 + index * 12
+            tag, kind = struct.unpack(endian + "HH", tiff[entry:entry + 4])
+            if tag == _ORIENTATION_TAG and kind == 3:  # SHORT
+                (value,) = struct.unpack(endian + "H", tiff[entry + 8:entry + 10])
+                return value if 1 <= value <= 8 else 1
+    except struct.error:
+        return 1
+    return 1
+
+
+def apply_orientation(image: np.ndarray, orientation: int) -> np.ndarray:
+    """Rotate/flip ``image`` so it displays upright for an EXIF orientation."""
+    if orientation == 2:
+        return cv2.flip(image, 1)
+    if orientation == 3:
+        return cv2.rotate(image, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(image, 0)
+    if orientation == 5:
+        return cv2.transpose(image)
+    if orientation == 6:
+        return cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.flip(cv2.transpose(image), -1)
+    if orientation == 8:
+        return cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return image
+
+
+def _decode_with_pil(data: bytes) -> np.ndarray:
+    image = Image.open(io.BytesIO(data))
+    image = ImageOps.exif_transpose(image)
+    image = image.convert("RGB")
+    return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+
+
+def decode_image(data: bytes, max_megapixels: float | None = None) -> np.ndarray:
+    """Decode image bytes into an upright BGR array.
+
+    With ``max_megapixels`` the header is checked first: oversized JPEGs are
+    decoded at the smallest power-of-two reduction that fits, other formats
+    raise ``ValueError``.
+    """
+    flags = cv2.IMREAD_COLOR
+    if max_megapixels:
+        width, height, fmt = read_dimensions(data)
+        megapixels = width * height / 1_000_000
+        if megapixels > max_megapixels:
+            flags = None
+            if fmt == "JPEG":
+                for factor, reduced in _REDUCED_JPEG_FLAGS:
+                    if megapixels / (factor * factor) <= max_megapixels:
+                        flags = reduced
+                        break
+            if flags is None:
+                raise ValueError(
+                    f"La imagen es demasiado grande ({megapixels:.0f} MP). "
+                    f"Maximo {max_megapixels:g} MP."
+                )
+
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    image = cv2.imdecode(buffer, flags | cv2.IMREAD_IGNORE_ORIENTATION)
+    if image is None:
+        try:
+            return _decode_with_pil(data)
+        except Exception as exc:
+            raise ValueError("No se pudo leer la imagen.") from exc
+    return apply_orientation(image, read_exif_orientation(data))
@@ -1,8 +1,11 @@
+import time
 from typing import List
 
 import cv2
 import numpy as np
 
+from .cancellation import CancelToken, check as check_cancelled
+
 
 def order_points(pts: np.ndarray) -> np.ndarray:
     rect = np.zeros((4, 2), dtype="float32")
@@ -17,7 +20,15 @@ def order_points(pts: np.ndarray) -> np.ndarray:
     return rect
 
 
-def four_point_transform(image: np.ndarray, pts: np.ndarray) -> np.ndarray:
+def four_point_transform(
+    image: np.ndarray, pts: np.ndarray, max_size: tuple[int, int] | None = None
+) -> np.ndarray:
+    """Warp the quad ``pts`` to a rectangle.
+
+    The output keeps the quad's native size unless ``max_size`` is given, in
+    which case it is shrunk (never enlarged) so its long and short sides fit
+    within ``max(max_size)`` and ``min(max_size)``.
+    """
     rect = order_points(pts)
     (tl, tr, br, bl) = rect
 
@@ -29,13 +40,31 @@ def four_point_transform(image: np.ndarray, pts: np.ndarray) -> np.ndarray:
     height_b = np.linalg.norm(tl - bl)
     max_height = int(max(height_a, height_b))
 
+    out_width, out_height = max_width, max_height
+    if max_size is not None and max_width > 0 and max_height > 0:
+        scale = min(
+            1.0,
+            max(max_size) / max(max_width, max_height),
+            min(max_size) / min(max_width, max_height),
+        )
+        out_width = max(1, int(round(max_width * scale)))
+        out_height = max(1, int(round(max_height * scale)))
+
+    # Bilinear sampling aliases fine print when shrinking by more than 2x, so
+    # warp to at most twice the output size and finish with an area resize.
+    warp_width = min(max_width, 2 * out_width)
+    warp_height = min(max_height, 2 * out_height)
+
     dst = np.array(
-        [[0, 0], [max_width - 1, 0], [max_width - 1, max_height - 1], [0, max_height - 1]],
+        [[0, 0], [warp_width - 1, 0], [warp_width - 1, warp_height - 1], [0, warp_height - 1]],
         dtype="float32",
     )
 
     matrix = cv2.getPerspectiveTransform(rect, dst)
-    return cv2.warpPerspective(image, matrix, (max_width, max_height))
+    warped = cv2.warpPerspective(image, matrix, (warp_width, warp_height))
+    if (warp_width, warp_height) != (out_width, out_height):
+        warped = cv2.resize(warped, (out_width, out_height), interpolation=cv2.INTER_AREA)
+    return warped
 
 
 def find_document_contour(edged: np.ndarray, min_area: float = 5000) -> np.ndarray | None:
@@ -126,31 +155,163 @@ def shrink_quad(quad: np.ndarray, factor: float = 0.92) -> np.ndarray:
     return center + (quad - center) * factor
 
 
-def process_image_to_documents(
-    image_bgr: np.ndarray,
-    debug: bool = False,
-    debug_prefix: str = "",
-    margin_ratio: float = 0.06,
-    rotate_portrait: bool = True,
-    max_docs: int = 6,
-    enhance_mode: str = "soft",
-) -> List[np.ndarray]:
-    processed_images: List[np.ndarray] = []
+# Detection cascade: a cheap pass at FAST_PASS_DIM first, the contour pass at
+# FULL_PASS_DIM only when the cheap one finds no card-shaped candidate.
+FAST_PASS_DIM = 480
+FULL_PASS_DIM = 1000
+CARD_RATIO_RANGE = (1.2, 2.2)
+_MIN_AREA_FRACTION = 0.05
+_BORDER_EPS = 5
+# Share of the fitted box outline that must lie near edge pixels (fast pass),
+# with a tolerance that absorbs mild perspective.
+_MIN_OUTLINE_COVERAGE = 0.75
+_OUTLINE_TOLERANCE = 0.04
+# Candidates overlapping a larger one by more than this IoU are duplicates
+# (e.g. a card's outer edge and its printed inner border).
+NMS_IOU = 0.5
 
-    orig = image_bgr.copy()
-    orig_h, orig_w = orig.shape[:2]
-    max_dim = 1000
+Candidates = list[tuple[float, np.ndarray]]
 
-    scale = 1.0
-    if max(orig_h, orig_w) > max_dim:
-        scale = max_dim / float(max(orig_h, orig_w))
-        image_bgr = cv2.resize(
-            image_bgr, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
-        )
 
+def _resize_long_edge(image_bgr: np.ndarray, max_dim: int) -> tuple[np.ndarray, float]:
+    h, w = image_bgr.shape[:2]
+    if max(h, w) <= max_dim:
+        return image_bgr, 1.0
+    scale = max_dim / float(max(h, w))
+    resized = cv2.resize(image_bgr, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return resized, scale
+
+
+def _subsample_long_edge(image_bgr: np.ndarray, max_dim: int) -> tuple[np.ndarray, float]:
+    # Plain decimation: no filtering cost, the Gaussian blur before Canny is
+    # enough for finding card outlines.
+    step = max(1, int(np.ceil(max(image_bgr.shape[:2]) / float(max_dim))))
+    return np.ascontiguousarray(image_bgr[::step, ::step]), 1.0 / step
+
+
+def _edges(image_bgr: np.ndarray) -> np.ndarray:
     gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
     gray = cv2.GaussianBlur(gray, (5, 5), 0)
-    edged = cv2.Canny(gray, 50, 150)
+    return cv2.Canny(gray, 50, 150)
+
+
+def _card_box(rect, min_area: float) -> tuple[float, np.ndarray] | None:
+    w_box, h_box = rect[1]
+    if w_box == 0 or h_box == 0:
+        return None
+    box = cv2.boxPoints(rect).astype("float32")
+    box_area = cv2.contourArea(box)
+    if box_area < min_area:
+        return None
+    ratio = max(w_box, h_box) / max(1.0, min(w_box, h_box))
+    if not (CARD_RATIO_RANGE[0] <= ratio <= CARD_RATIO_RANGE[1]):
+        return None
+    return box_area, box
+
+
+def _touches_border(x: int, y: int, cw: int, ch: int, w: int, h: int) -> bool:
+    return (
+        x <= _BORDER_EPS
+        or y <= _BORDER_EPS
+        or x + cw >= w - _BORDER_EPS
+        or y + ch >= h - _BORDER_EPS
+    )
+
+
+def _outline_coverage(
+    edge_distance: np.ndarray, box: np.ndarray, tolerance: float, samples: int = 240
+) -> float:
+    corners = np.vstack([box, box[:1]])
+    t = np.linspace(0.0, 1.0, samples // 4, endpoint=False)[:, None]
+    points = np.vstack([a + (b - a) * t for a, b in zip(corners[:-1], corners[1:])])
+    xs = np.clip(points[:, 0].round().astype(int), 0, edge_distance.shape[1] - 1)
+    ys = np.clip(points[:, 1].round().astype(int), 0, edge_distance.shape[0] - 1)
+    return float((edge_distance[ys, xs] <= tolerance).mean())
+
+
+def _fast_pass_candidates(image_bgr: np.ndarray) -> tuple[Candidates, Candidates]:
+    """Card candidates from edge components, pre-filtered on their bounding boxes."""
+    edged = cv2.dilate(_edges(image_bgr), np.ones((3, 3), np.uint8))
+    h, w = edged.shape[:2]
+    min_area = _MIN_AREA_FRACTION * h * w
+    edge_distance = None
+
+    _, labels, stats, _ = cv2.connectedComponentsWithStats(edged, connectivity=8)
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    # A tilted card's bounding box is squarer than the card, never longer.
+    bbox_ratio = np.maximum(widths, heights) / np.maximum(1, np.minimum(widths, heights))
+    keep = np.flatnonzero(
+        (widths * heights >= min_area) & (bbox_ratio <= CARD_RATIO_RANGE[1])
+    ) + 1
+
+    internal: Candidates = []
+    border: Candidates = []
+    for label in keep:
+        x, y, cw, ch = (int(v) for v in stats[label, :4])
+        mask = (labels[y:y + ch, x:x + cw] == label).astype(np.uint8)
+        points = cv2.findNonZero(mask) + np.array([x, y], dtype=np.int32)
+        rect = cv2.minAreaRect(points)
+        candidate = _card_box(rect, min_area)
+        if candidate is None:
+            continue
+        # The component may be an outline or a blob of texture: keep it only
+        # if its fitted box actually runs along edges.
+        if edge_distance is None:
+            edge_distance = cv2.distanceTransform(255 - edged, cv2.DIST_L2, 3)
+        tolerance = max(2.0, _OUTLINE_TOLERANCE * min(rect[1]))
+        if _outline_coverage(edge_distance, candidate[1], tolerance) < _MIN_OUTLINE_COVERAGE:
+            continue
+        if _touches_border(x, y, cw, ch, w, h):
+            border.append(candidate)
+        else:
+            internal.append(candidate)
+    return internal, border
+
+
+def _quad_iou(a: np.ndarray, b: np.ndarray) -> float:
+    inter, _ = cv2.intersectConvexConvex(a, b)
+    union = cv2.contourArea(a) + cv2.contourArea(b) - inter
+    return float(inter / union) if union > 0 else 0.0
+
+
+def suppress_overlaps(candidates: Candidates, iou_threshold: float) -> tuple[Candidates, int]:
+    """Greedy non-maximum suppression over candidate quads, largest first.
+
+    Pairwise IoU of the axis-aligned boxes is computed in one vectorised step;
+    since it over-estimates overlap for tilted quads, only pairs above the
+    threshold are confirmed with the exact polygon IoU. Returns the kept
+    candidates and how many were suppressed.
+    """
+    if len(candidates) < 2:
+        return list(candidates), 0
+    ordered = sorted(candidates, key=lambda c: c[0], reverse=True)
+    boxes = np.stack([box for _, box in ordered])
+    lo = boxes.min(axis=1)
+    hi = boxes.max(axis=1)
+    area = np.prod(hi - lo, axis=1)
+    inter_wh = np.clip(
+        np.minimum(hi[:, None], hi[None, :]) - np.maximum(lo[:, None], lo[None, :]), 0, None
+    )
+    inter = inter_wh[..., 0] * inter_wh[..., 1]
+    aabb_iou = inter / np.maximum(area[:, None] + area[None, :] - inter, 1e-6)
+
+    suppressed = np.zeros(len(ordered), dtype=bool)
+    for i in range(len(ordered)):
+        if suppressed[i]:
+            continue
+        for j in np.flatnonzero((aabb_iou[i] > iou_threshold) & ~suppressed):
+            if j > i and _quad_iou(boxes[i], boxes[j]) > iou_threshold:
+                suppressed[j] = True
+    kept = [candidate for candidate, drop in zip(ordered, suppressed) if not drop]
+    return kept, int(suppressed.sum())
+
+
+def _full_pass_candidates(
+    image_bgr: np.ndarray, debug: bool = False, debug_prefix: str = ""
+) -> tuple[Candidates, Candidates]:
+    """Card candidates from the external contours of the edge map."""
+    edged = _edges(image_bgr)
 
     if debug:
         cv2.imwrite(f"{debug_prefix}debug_edges_multi.jpg", edged)
@@ -160,43 +321,71 @@ def process_image_to_documents(
     )
 
     h, w = edged.shape[:2]
-    min_area = 0.05 * h * w
-
-    internal_candidates: list[tuple[float, np.ndarray]] = []
-    border_candidates: list[tuple[float, np.ndarray]] = []
-    border_eps = 5
+    min_area = _MIN_AREA_FRACTION * h * w
 
+    internal: Candidates = []
+    border: Candidates = []
     for contour in contours:
         area = cv2.contourArea(contour)
         if area < min_area:
             continue
 
-        x, y, cw, ch = cv2.boundingRect(contour)
-        touches_border = (
-            x <= border_eps
-            or y <= border_eps
-            or x + cw >= w - border_eps
-            or y + ch >= h - border_eps
-        )
-
-        rect = cv2.minAreaRect(contour)
-        box = cv2.boxPoints(rect).astype("float32")
-        box_area = cv2.contourArea(box)
-        if box_area < min_area:
+        candidate = _card_box(cv2.minAreaRect(contour), min_area)
+        if candidate is None:
             continue
 
-        w_box, h_box = rect[1]
-        if w_box == 0 or h_box == 0:
-            continue
+        x, y, cw, ch = cv2.boundingRect(contour)
+        if _touches_border(x, y, cw, ch, w, h):
+            border.append(candidate)
+        else:
+            internal.append(candidate)
+    return internal, border
 
-        ratio = max(w_box, h_box) / max(1.0, min(w_box, h_box))
-        if not (1.2 <= ratio <= 2.2):
-            continue
 
-        if touches_border:
-            border_candidates.append((box_area, box))
-        else:
-            internal_candidates.append((box_area, box))
+def process_image_to_documents(
+    image_bgr: np.ndarray,
+    debug: bool = False,
+    debug_prefix: str = "",
+    margin_ratio: float = 0.06,
+    rotate_portrait: bool = True,
+    max_docs: int = 6,
+    enhance_mode: str = "soft",
+    fast_pass_dim: int | None = FAST_PASS_DIM,
+    nms_iou: float = NMS_IOU,
+    output_size: tuple[int, int] | None = None,
+    stats: dict | None = None,
+    cancel: CancelToken | None = None,
+) -> List[np.ndarray]:
+    """Detect, warp and enhance up to ``max_docs`` cards in a photo.
+
+    ``fast_pass_dim=None`` skips the cheap detection pass. Overlapping
+    candidates (IoU above ``nms_iou``) are suppressed before any warping.
+    ``output_size`` caps each warped card (see ``four_point_transform``) so the
+    enhancement runs at the resolution the card is printed at, not the photo's.
+    When ``stats`` is given it receives ``detection_level`` ("fast", "full" or
+    "fallback" for the whole-frame crop), the detected ``quads`` in input-image
+    coordinates, the number of ``suppressed`` candidates and ``detect_ms``.
+    ``cancel`` is checked after detection and before each warp and enhance
+    step; ``PipelineCancelled`` propagates to the caller.
+    """
+    processed_images: List[np.ndarray] = []
+
+    detect_start = time.perf_counter()
+
+    level = "full"
+    internal_candidates: Candidates = []
+    border_candidates: Candidates = []
+    if fast_pass_dim:
+        small, scale = _subsample_long_edge(image_bgr, fast_pass_dim)
+        internal_candidates, border_candidates = _fast_pass_candidates(small)
+        if internal_candidates or border_candidates:
+            level = "fast"
+    if level != "fast":
+        small, scale = _resize_long_edge(image_bgr, FULL_PASS_DIM)
+        internal_candidates, border_candidates = _full_pass_candidates(
+            small, debug=debug, debug_prefix=debug_prefix
+        )
+    h, w = small.shape[:2]
 
     if internal_candidates:
         candidates = sorted(internal_candidates, key=lambda x: x[0], reverse=True)
@@ -204,9 +393,11 @@ def process_image_to_documents(
         candidates = sorted(border_candidates, key=lambda x: x[0], reverse=True)
     else:
         candidates = []
+    candidates, suppressed = suppress_overlaps(candidates, nms_iou)
 
     candidates = candidates[:max_docs]
     if not candidates:
+        level = "fallback"
         full_rect = np.array(
             [[0, 0], [w - 1, 0], [w - 1, h - 1], [0, h - 1]],
             dtype="float32",
@@ -216,6 +407,13 @@ def process_image_to_documents(
     candidates.sort(key=lambda x: x[0], reverse=True)
     candidates = candidates[:max_docs]
 
+    if stats is not None:
+        stats["detection_level"] = level
+        stats["quads"] = [order_points(cnt / scale) for _, cnt in candidates]
+        stats["suppressed"] = suppressed
+        stats["detect_ms"] = (time.perf_counter() - detect_start) * 1000
+    check_cancelled(cancel, "detect")
+
     for idx, (_, cnt) in enumerate(candidates):
         if idx >= max_docs:
             break
@@ -224,11 +422,15 @@ def process_image_to_documents(
         doc_contour = shrink_quad(doc_contour, factor=0.92)
 
         if debug:
-            dbg = orig.copy()
+            dbg = image_bgr.copy()
             cv2.drawContours(dbg, [doc_contour.astype(int)], -1, (0, 255, 0), 3)
             cv2.imwrite(f"{debug_prefix}debug_contour_doc_{idx+1}.jpg", dbg)
 
-        warped = four_point_transform(orig, doc_contour.astype("float32"))
+        check_cancelled(cancel, "warp")
+        warped = four_point_transform(
+            image_bgr, doc_contour.astype("float32"), max_size=output_size
+        )
+        check_cancelled(cancel, "enhance")
         warped_gray = cv2.cvtColor(warped, cv2.COLOR_BGR2GRAY)
 
         if enhance_mode == "hard":
@@ -277,3 +479,53 @@ def process_image_to_documents(
         processed_images.append(warped_padded)
 
     return processed_images
+
+
+def apply_edits(image_bgr: np.ndarray, ops) -> np.ndarray:
+    """Apply client edit operations in order.
+
+    Supported operations, with coordinates normalised to the current image:
+      {"op": "crop", "rect": [x, y, w, h]}
+      {"op": "rotate", "quadrant": 1 | -1 | 2}   (90° clockwise / counter / 180°)
+      {"op": "quad", "points": [[x, y], [x, y], [x, y], [x, y]]}
+    """
+    image = image_bgr
+    for op in ops or []:
+        if not isinstance(op, dict):
+            raise ValueError("Operacion de edicion invalida.")
+        h, w = image.shape[:2]
+        kind = op.get("op")
+        if kind == "crop":
+            try:
+                x, y, cw, ch = (float(v) for v in op["rect"])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError("Recorte invalido.")
+            x0 = int(round(min(max(x, 0.0), 1.0) * w))
+            y0 = int(round(min(max(y, 0.0), 1.0) * h))
+            x1 = int(round(min(max(x + cw, 0.0), 1.0) * w))
+            y1 = int(round(min(max(y + ch, 0.0), 1.0) * h))
+            if x1 - x0 < 2 or y1 - y0 < 2:
+                raise ValueError("Recorte invalido.")
+            image = image[y0:y1, x0:x1]
+        elif kind == "rotate":
+            quadrant = op.get("quadrant")
+            if quadrant == 1:
+                image = cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
+            elif quadrant == -1:
+                image = cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
+            elif quadrant in (2, -2):
+                image = cv2.rotate(image, cv2.ROTATE_180)
+            else:
+                raise ValueError("Rotacion invalida.")
+        elif kind == "quad":
+            try:
+                points = np.array(op["points"], dtype="float32").reshape(4, 2)
+            except (KeyError, TypeError, ValueError):
+                raise ValueError("Cuadrilatero invalido.")
+            points = np.clip(points, 0.0, 1.0) * np.array([w - 1, h - 1], dtype="float32")
+            image = four_point_transform(image, points)
+            if min(image.shape[:2]) < 2:
+                raise ValueError("Cuadrilatero invalido.")
+        else:
+            raise ValueError("Operacion de edicion invalida.")
+    return np.ascontiguousarray(image)
@@ -4,6 +4,30 @@ from typing import List
 import numpy as np
 from PIL import Image
 
+from .cancellation import CancelToken, check as check_cancelled
+
+
+CARD_ASPECT_RATIO = 1.6
+
+
+def cell_size_px(
+    dpi: int = 300,
+    outer_margin_mm: float = 8.0,
+    inner_margin_mm_x: float = 8.0,
+    inner_margin_mm_y: float = 2.0,
+    grid_rows: int = 3,
+    grid_cols: int = 2,
+) -> tuple[int, int]:
+    """Return ``(width, height)`` in pixels of one card slot on the A4 page."""
+    a4_width_mm = 210
+    page_width_px = int(a4_width_mm / 25.4 * dpi)
+    outer_margin_px = int((outer_margin_mm / 25.4) * dpi)
+    inner_margin_px_x = int((inner_margin_mm_x / 25.4) * dpi)
+
+    content_width_px = page_width_px - 2 * outer_margin_px
+    cell_width = (content_width_px - inner_margin_px_x * (grid_cols - 1)) // grid_cols
+    return cell_width, int(cell_width / CARD_ASPECT_RATIO)
+
 
 def _build_page_image(
     images_bgr: List[np.ndarray],
@@ -13,6 +37,7 @@ def _build_page_image(
     inner_margin_mm_y: float = 2.0,
     grid_rows: int = 3,
     grid_cols: int = 2,
+    cancel: CancelToken | None = None,
 ) -> Image.Image:
     if not images_bgr:
         raise ValueError("No se recibieron imágenes para generar el PDF")
@@ -35,18 +60,18 @@ def _build_page_image(
     inner_margin_px_x = int((inner_margin_mm_x / 25.4) * dpi)
     inner_margin_px_y = int((inner_margin_mm_y / 25.4) * dpi)
 
-    content_width_px = page_width_px - 2 * outer_margin_px
-    cell_width = (content_width_px - inner_margin_px_x * (grid_cols - 1)) // grid_cols
+    cell_width, card_height_px = cell_size_px(
+        dpi, outer_margin_mm, inner_margin_mm_x, inner_margin_mm_y, grid_rows, grid_cols
+    )
     if cell_width <= 0:
         raise ValueError("No hay espacio horizontal para las imágenes")
 
-    card_aspect_ratio = 1.6
-    card_height_px = int(cell_width / card_aspect_ratio)
     grid_start_y = outer_margin_px
 
     page = Image.new("RGB", (page_width_px, page_height_px), color=(255, 255, 255))
 
     for idx, img_bgr in enumerate(images_bgr):
+        check_cancelled(cancel, "layout")
         img_rgb = img_bgr[:, :, ::-1]
         pil_img = Image.fromarray(img_rgb)
 
@@ -77,6 +102,7 @@ def create_single_page_pdf_bytes(
     inner_margin_mm_y: float = 2.0,
     grid_rows: int = 3,
     grid_cols: int = 2,
+    cancel: CancelToken | None = None,
 ) -> bytes:
     page = _build_page_image(
         images_bgr=images_bgr,
@@ -86,7 +112,9 @@ def create_single_page_pdf_bytes(
         inner_margin_mm_y=inner_margin_mm_y,
         grid_rows=grid_rows,
         grid_cols=grid_cols,
+        cancel=cancel,
     )
+    check_cancelled(cancel, "save")
 
     buf = io.BytesIO()
     page.save(buf, "PDF", resolution=dpi)
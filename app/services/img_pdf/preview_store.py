@@ -0,0 +1,86 @@
+"""Short-lived server-side copies of extracted documents and source frames.
+
+Preview hands the client an opaque token per image; /generate loads the image
+back by token and applies the client's edit operations to it, so edited cards
+never travel as base64 PNGs. A token can also carry a small JSON sidecar (the
+preview's timings, read back into the job's telemetry). Files live under ``<directory>/<owner>/`` and are
+swept once older than ``max_age`` seconds. Encoding is left to the caller so
+this module (and the cleanup command) does not import the CV stack.
+"""
+import json
+import os
+import re
+import secrets
+import time
+
+
+_TOKEN_RE = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+_SUFFIX = ".png"
+_META_SUFFIX = ".json"
+
+
+def _owner_dir(directory: str, owner) -> str:
+    return os.path.join(directory, str(int(owner)))
+
+
+def save_png(directory: str, owner, data: bytes) -> str:
+    """Store an encoded PNG for ``owner`` and return its token."""
+    folder = _owner_dir(directory, owner)
+    os.makedirs(folder, exist_ok=True)
+    token = secrets.token_urlsafe(18)
+    tmp_path = os.path.join(folder, f".{token}.tmp")
+    with open(tmp_path, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp_path, os.path.join(folder, f"{token}{_SUFFIX}"))
+    return token
+
+
+def png_path(directory: str, owner, token: str) -> str:
+    """Return the stored file for ``token``; raise ``ValueError`` if gone."""
+    if not isinstance(token, str) or not _TOKEN_RE.match(token):
+        raise ValueError("Token de imagen invalido.")
+    path = os.path.join(_owner_dir(directory, owner), f"{token}{_SUFFIX}")
+    if not os.path.isfile(path):
+        raise ValueError("La previsualizacion expiro. Volve a previsualizar las imagenes.")
+    return path
+
+
+def save_meta(directory: str, owner, token: str, meta: dict) -> None:
+    """Attach ``meta`` to a stored image."""
+    path = png_path(directory, owner, token)[: -len(_SUFFIX)] + _META_SUFFIX
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(meta, fh)
+
+
+def load_meta(directory: str, owner, token: str) -> dict | None:
+    """Return the sidecar saved for ``token``, or None if there is none."""
+    if not isinstance(token, str) or not _TOKEN_RE.match(token):
+        return None
+    path = os.path.join(_owner_dir(directory, owner), f"{token}{_META_SUFFIX}")
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def cleanup(directory: str, max_age: int, owner=None) -> int:
+    """Delete stored images older than ``max_age`` seconds; return how many."""
+    if not os.path.isdir(directory):
+        return 0
+    cutoff = time.time() - max_age
+    folders = [_owner_dir(directory, owner)] if owner is not None else [
+        entry.path for entry in os.scandir(directory) if entry.is_dir()
+    ]
+    removed = 0
+    for folder in folders:
+        if not os.path.isdir(folder):
+            continue
+        for entry in os.scandir(folder):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                continue
+    return removed
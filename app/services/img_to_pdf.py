@@ -1,27 +1,44 @@
 import base64
-import io
 import os
-from typing import Iterable, List
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List
 
 import cv2
 import numpy as np
-from PIL import Image, ImageOps
 
-from .img_pdf.image_processor import process_image_to_documents
-from .img_pdf.pdf_maker import create_single_page_pdf_bytes
+from .img_pdf import preview_store
+from .img_pdf.archive import iter_zip_images
+from .img_pdf.cancellation import CancelToken, PipelineCancelled, check as check_cancelled
+from .img_pdf.image_decoder import decode_image
+from .img_pdf.image_processor import NMS_IOU, apply_edits, process_image_to_documents
+from .img_pdf.pdf_maker import cell_size_px, create_single_page_pdf_bytes
 
 
 MAX_FILES = 6
 MAX_DOCS = 6
 MAX_FILE_MB = 10
+# Decoded size budget per photo; larger JPEGs are decoded at reduced scale.
+MAX_INPUT_MEGAPIXELS = 24.0
 ALLOWED_TYPES = {"image/jpeg", "image/png", "image/jpg"}
-
-
-def _decode_image_bytes(data: bytes) -> np.ndarray:
-    image = Image.open(io.BytesIO(data))
-    image = ImageOps.exif_transpose(image)
-    image = image.convert("RGB")
-    return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+# ZIP uploads are read entry by entry; each image inside is checked against
+# MAX_FILE_MB and the decoded-size budget like a direct upload.
+ZIP_TYPES = {"application/zip", "application/x-zip-compressed"}
+MAX_ZIP_MB = 25
+MAX_ZIP_ENTRIES = 200
+MAX_ZIP_UNCOMPRESSED_MB = 150
+
+PDF_LAYOUT = {
+    "dpi": 300,
+    "outer_margin_mm": 8.0,
+    "inner_margin_mm_x": 8.0,
+    "inner_margin_mm_y": 2.0,
+    "grid_rows": 3,
+    "grid_cols": 2,
+}
+# Cards are warped straight to the size of their slot on the PDF page; the
+# white margin added afterwards leaves a little headroom for the resize.
+DOCUMENT_OUTPUT_SIZE = cell_size_px(**PDF_LAYOUT)
 
 
 def _encode_image_png(image_bgr: np.ndarray) -> bytes:
@@ -31,6 +48,49 @@ def _encode_image_png(image_bgr: np.ndarray) -> bytes:
     return buffer.tobytes()
 
 
+# Per-stage telemetry kept on the job (see ``create_pdf_from_documents``).
+TELEMETRY_TIMINGS = ("decode_ms", "detect_ms", "render_ms", "pdf_ms")
+TELEMETRY_INPUTS = ("input_bytes", "input_megapixels")
+
+
+@contextmanager
+def _timed(telemetry: dict | None, key: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if telemetry is not None:
+            telemetry[key] = telemetry.get(key, 0) + (time.perf_counter() - start) * 1000
+
+
+def _add(telemetry: dict | None, key: str, value) -> None:
+    if telemetry is not None:
+        telemetry[key] = telemetry.get(key, 0) + value
+
+
+def _add_input(telemetry: dict | None, size: int, image: np.ndarray) -> None:
+    _add(telemetry, "input_bytes", size)
+    _add(telemetry, "input_megapixels", image.shape[0] * image.shape[1] / 1_000_000)
+
+
+def _store_preview(cache_dir: str, owner, image_bgr: np.ndarray) -> str:
+    image = image_bgr
+    # The enhanced outputs are grey replicated into BGR; keep one channel.
+    if np.array_equal(image[..., 0], image[..., 1]) and np.array_equal(image[..., 1], image[..., 2]):
+        image = image[..., 0]
+    ok, buffer = cv2.imencode(".png", image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+    if not ok:
+        raise ValueError("No se pudo codificar la imagen.")
+    return preview_store.save_png(cache_dir, owner, buffer.tobytes())
+
+
+def _load_preview(cache_dir: str, owner, token: str) -> np.ndarray:
+    image = cv2.imread(preview_store.png_path(cache_dir, owner, token), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("No se pudo leer la imagen.")
+    return image
+
+
 def data_url_from_png(data: bytes) -> str:
     b64 = base64.b64encode(data).decode("ascii")
     return f"data:image/png;base64,{b64}"
@@ -80,91 +140,304 @@ def decode_data_url(data_url: str) -> np.ndarray:
     if not header.startswith("data:image"):
         raise ValueError("Formato de imagen invalido.")
     raw = base64.b64decode(encoded)
-    return _decode_image_bytes(raw)
+    return decode_image(raw, max_megapixels=MAX_INPUT_MEGAPIXELS)
+
+
+def _is_zip(file_storage) -> bool:
+    # Some browsers send ZIPs as a generic binary type.
+    if file_storage.mimetype in ZIP_TYPES:
+        return True
+    return file_storage.mimetype == "application/octet-stream" and (
+        file_storage.filename or ""
+    ).lower().endswith(".zip")
 
 
 def validate_upload(file_storage) -> None:
-    if file_storage.mimetype not in ALLOWED_TYPES:
+    is_zip = _is_zip(file_storage)
+    if file_storage.mimetype not in ALLOWED_TYPES and not is_zip:
         raise ValueError(f"Tipo de archivo no soportado: {file_storage.mimetype}")
     file_storage.stream.seek(0, os.SEEK_END)
     size = file_storage.stream.tell()
     file_storage.stream.seek(0)
-    if size > MAX_FILE_MB * 1024 * 1024:
-        raise ValueError(f"Archivo excede {MAX_FILE_MB}MB.")
+    max_mb = MAX_ZIP_MB if is_zip else MAX_FILE_MB
+    if size > max_mb * 1024 * 1024:
+        raise ValueError(f"Archivo excede {max_mb}MB.")
 
 
-def build_previews(
-    files, enhance_mode: str = "soft", file_keys: list[str] | None = None
-) -> list[dict]:
-    previews: list[dict] = []
-    processed_images: list[np.ndarray] = []
+def _iter_upload_images(files, file_keys: list[str] | None) -> Iterator[tuple[str, bytes]]:
+    """Yield ``(source_key, data)`` per image, reading ZIP entries one at a time.
 
+    Images from a ZIP share the archive's ``source_key``, so removing the ZIP
+    from the upload list drops all of its documents.
+    """
     for idx, file_storage in enumerate(files):
         validate_upload(file_storage)
-        data = file_storage.read()
         source_key = None
         if file_keys and idx < len(file_keys):
             source_key = file_keys[idx]
         if not source_key:
             source_key = file_storage.filename or str(idx)
-        image = _decode_image_bytes(data)
-        full_processed = _enhance_full_image(image, enhance_mode)
-        full_data_url = data_url_from_jpeg(_encode_preview_jpeg(full_processed))
-
-        docs_left = MAX_DOCS - len(processed_images)
+        if _is_zip(file_storage):
+            for _, data in iter_zip_images(
+                file_storage.stream,
+                max_entries=MAX_ZIP_ENTRIES,
+                max_entry_bytes=MAX_FILE_MB * 1024 * 1024,
+                max_total_bytes=MAX_ZIP_UNCOMPRESSED_MB * 1024 * 1024,
+            ):
+                yield source_key, data
+        else:
+            yield source_key, file_storage.read()
+
+
+def iter_previews(
+    files,
+    enhance_mode: str = "soft",
+    file_keys: list[str] | None = None,
+    file_stats: list[dict] | None = None,
+    cache_dir: str | None = None,
+    owner=None,
+    max_megapixels: float = MAX_INPUT_MEGAPIXELS,
+    nms_iou: float = NMS_IOU,
+    cancel: CancelToken | None = None,
+) -> Iterator[dict]:
+    """Yield preview events as soon as each image is processed.
+
+    ZIP uploads contribute each image entry in turn (see
+    ``_iter_upload_images``); only one decoded image is held at a time.
+
+    Per image, a ``{"type": "source", ...}`` event carries the enhanced full
+    frame, followed by one ``{"type": "document", ...}`` event per extracted
+    document that references it by ``source_id``. Raises ``ValueError`` after
+    the last file if nothing was extracted.
+
+    When ``file_stats`` is given, one dict per processed image is appended to it
+    with the input ``bytes``, decoded ``megapixels``, extracted ``documents``,
+    the ``detection_level`` that found them, the duplicate candidates
+    ``suppressed`` before warping and the ``decode_ms``, ``detect_ms`` and
+    ``render_ms`` (enhance, warp and preview encoding) it took.
+
+    When ``cache_dir`` is given, copies are kept for ``owner`` and events
+    carry a ``token`` for ``create_pdf_from_documents``; each token also gets
+    its photo's timings and input size, which end up on the job.
+
+    Photos over ``max_megapixels`` are decoded at reduced scale (JPEG) or
+    rejected, based on their header alone.
+
+    ``cancel`` is checked before every file and stage; once it fires,
+    ``PipelineCancelled`` is raised and the events already yielded stand.
+    """
+    docs_count = 0
+
+    images = _iter_upload_images(files, file_keys)
+    for idx, (source_key, data) in enumerate(images):
+        check_cancelled(cancel, "decode")
+        timings: dict = {}
+        with _timed(timings, "decode_ms"):
+            image = decode_image(data, max_megapixels=max_megapixels)
+
+        docs_left = MAX_DOCS - docs_count
         if docs_left <= 0:
             break
 
-        docs = process_image_to_documents(
-            image,
-            debug=False,
-            debug_prefix="",
-            margin_ratio=0.06,
-            rotate_portrait=True,
-            max_docs=docs_left,
-            enhance_mode=enhance_mode,
-        )
-        for doc in docs:
-            processed_images.append(doc)
-            if len(processed_images) >= MAX_DOCS:
-                break
-            previews.append(
+        check_cancelled(cancel, "source")
+        with _timed(timings, "render_ms"):
+            full_processed = _enhance_full_image(image, enhance_mode)
+            source_event = {
+                "type": "source",
+                "source_id": idx,
+                "source_key": source_key,
+                "full_data_url": data_url_from_jpeg(_encode_preview_jpeg(full_processed)),
+            }
+            if cache_dir:
+                source_event["token"] = _store_preview(cache_dir, owner, full_processed)
+        yield source_event
+
+        detection: dict = {}
+        with _timed(timings, "render_ms"):
+            docs = process_image_to_documents(
+                image,
+                debug=False,
+                debug_prefix="",
+                margin_ratio=0.06,
+                rotate_portrait=True,
+                max_docs=docs_left,
+                enhance_mode=enhance_mode,
+                nms_iou=nms_iou,
+                output_size=DOCUMENT_OUTPUT_SIZE,
+                stats=detection,
+                cancel=cancel,
+            )
+        # Detection ran inside process_image_to_documents; keep it apart.
+        timings["detect_ms"] = detection["detect_ms"]
+        timings["render_ms"] -= detection["detect_ms"]
+        megapixels = image.shape[0] * image.shape[1] / 1_000_000
+        meta = {
+            **timings,
+            "source": source_event.get("token"),
+            "input_bytes": len(data),
+            "input_megapixels": megapixels,
+        }
+        if file_stats is not None:
+            file_stats.append(
                 {
-                    "id": len(previews),
-                    "source_key": source_key,
-                    "data_url": data_url_from_jpeg(_encode_preview_jpeg(doc)),
-                    "full_data_url": full_data_url,
-                    "width": doc.shape[1],
-                    "height": doc.shape[0],
+                    "bytes": len(data),
+                    "megapixels": megapixels,
+                    "documents": len(docs),
+                    "detection_level": detection["detection_level"],
+                    "suppressed": detection["suppressed"],
+                    **timings,
                 }
             )
-
-        if len(processed_images) >= MAX_DOCS:
+        if cache_dir:
+            preview_store.save_meta(cache_dir, owner, source_event["token"], meta)
+        for doc in docs:
+            check_cancelled(cancel, "encode")
+            docs_count += 1
+            if docs_count >= MAX_DOCS:
+                break
+            doc_event = {
+                "type": "document",
+                "id": docs_count - 1,
+                "source_id": idx,
+                "source_key": source_key,
+                "data_url": data_url_from_jpeg(_encode_preview_jpeg(doc)),
+                "width": doc.shape[1],
+                "height": doc.shape[0],
+            }
+            if cache_dir:
+                doc_event["token"] = _store_preview(cache_dir, owner, doc)
+                preview_store.save_meta(cache_dir, owner, doc_event["token"], meta)
+            yield doc_event
+
+
+        # Drop this image's arrays before the next entry is decoded.
+        del image, full_processed, docs
+        if docs_count >= MAX_DOCS:
             break
 
-    if not processed_images:
+    if not docs_count:
         raise ValueError("No se pudo extraer ningún documento.")
 
+
+def build_previews(
+    files,
+    enhance_mode: str = "soft",
+    file_keys: list[str] | None = None,
+    file_stats: list[dict] | None = None,
+    cache_dir: str | None = None,
+    owner=None,
+    max_megapixels: float = MAX_INPUT_MEGAPIXELS,
+    nms_iou: float = NMS_IOU,
+    cancel: CancelToken | None = None,
+) -> list[dict]:
+    """Extract document previews from uploaded files (see ``iter_previews``).
+
+    On ``PipelineCancelled`` the previews finished so far are attached to the
+    exception as ``partial``.
+    """
+    previews: list[dict] = []
+    sources: dict[int, dict] = {}
+    events = iter_previews(
+        files, enhance_mode, file_keys, file_stats, cache_dir, owner, max_megapixels, nms_iou,
+        cancel,
+    )
+    try:
+        for event in events:
+            if event["type"] == "source":
+                sources[event["source_id"]] = event
+                continue
+            preview = {
+                "id": event["id"],
+                "source_key": event["source_key"],
+                "data_url": event["data_url"],
+                "full_data_url": sources[event["source_id"]]["full_data_url"],
+                "width": event["width"],
+                "height": event["height"],
+            }
+            if "token" in event:
+                preview["token"] = event["token"]
+                preview["source_token"] = sources[event["source_id"]]["token"]
+            previews.append(preview)
+    except PipelineCancelled as exc:
+        exc.partial = previews
+        raise
     return previews
 
 
-def create_pdf_from_data_urls(data_urls: Iterable[str]) -> tuple[bytes, int]:
+def create_pdf_from_data_urls(
+    data_urls: Iterable[str], cancel: CancelToken | None = None, telemetry: dict | None = None
+) -> tuple[bytes, int]:
     images: list[np.ndarray] = []
     for data_url in data_urls:
-        images.append(decode_data_url(data_url))
+        check_cancelled(cancel, "decode")
+        with _timed(telemetry, "decode_ms"):
+            image = decode_data_url(data_url)
+        _add_input(telemetry, len(data_url) * 3 // 4, image)
+        images.append(image)
 
     if not images:
         raise ValueError("No se recibieron imágenes para generar el PDF.")
 
-    pdf_bytes = create_single_page_pdf_bytes(
-        images_bgr=images,
-        dpi=300,
-        outer_margin_mm=8.0,
-        inner_margin_mm_x=8.0,
-        inner_margin_mm_y=2.0,
-        grid_rows=3,
-        grid_cols=2,
-    )
+    with _timed(telemetry, "pdf_ms"):
+        pdf_bytes = create_single_page_pdf_bytes(
+            images_bgr=images,
+            **PDF_LAYOUT,
+            cancel=cancel,
+        )
+    return pdf_bytes, len(images)
+
+
+def create_pdf_from_documents(
+    documents: Iterable[dict],
+    cache_dir: str,
+    owner,
+    cancel: CancelToken | None = None,
+    telemetry: dict | None = None,
+) -> tuple[bytes, int]:
+    """Build the PDF from stored previews plus the client's edit operations.
+
+    Each entry is ``{"token": ..., "ops": [...]}`` (see ``apply_edits``), or
+    ``{"data_url": ...}`` for images the server never stored.
+
+    When ``telemetry`` is given it receives the milliseconds spent per stage
+    (``TELEMETRY_TIMINGS``) and the input size (``TELEMETRY_INPUTS``): the
+    preview's figures for each photo the documents came from, counted once,
+    plus what this call spent loading, editing and laying out the PDF.
+    """
+    images: list[np.ndarray] = []
+    seen_sources: set[str] = set()
+    for document in documents:
+        check_cancelled(cancel, "decode")
+        if not isinstance(document, dict):
+            raise ValueError("Formato de imagen invalido.")
+        if document.get("token"):
+            with _timed(telemetry, "decode_ms"):
+                image = _load_preview(cache_dir, owner, document["token"])
+            with _timed(telemetry, "render_ms"):
+                images.append(apply_edits(image, document.get("ops")))
+            if telemetry is not None:
+                meta = preview_store.load_meta(cache_dir, owner, document["token"])
+                if meta and meta.get("source") not in seen_sources:
+                    seen_sources.add(meta.get("source"))
+                    for key in TELEMETRY_TIMINGS + TELEMETRY_INPUTS:
+                        _add(telemetry, key, meta.get(key, 0))
+        elif document.get("data_url"):
+            with _timed(telemetry, "decode_ms"):
+                image = decode_data_url(document["data_url"])
+            _add_input(telemetry, len(document["data_url"]) * 3 // 4, image)
+            images.append(image)
+        else:
+            raise ValueError("Formato de imagen invalido.")
+
+    if not images:
+        raise ValueError("No se recibieron imágenes para generar el PDF.")
+
+    with _timed(telemetry, "pdf_ms"):
+        pdf_bytes = create_single_page_pdf_bytes(
+            images_bgr=images,
+            **PDF_LAYOUT,
+            cancel=cancel,
+        )
     return pdf_bytes, len(images)
 
 
@@ -193,11 +466,28 @@ def create_pdf_from_files(image_paths: Iterable[str]) -> tuple[bytes, int]:
 
     pdf_bytes = create_single_page_pdf_bytes(
         images_bgr=images,
-        dpi=300,
-        outer_margin_mm=8.0,
-        inner_margin_mm_x=8.0,
-        inner_margin_mm_y=2.0,
-        grid_rows=3,
-        grid_cols=2,
+        **PDF_LAYOUT,
     )
     return pdf_bytes, len(images)
+
+
+def warm_up() -> None:
+    """Run a tiny synthetic photo through the pipeline once.
+
+    Pays OpenCV's one-time initialisation (CLAHE, codec tables, first-call
+    allocations) before a worker serves real traffic.
+    """
+    image = np.full((480, 640, 3), (110, 90, 70), dtype=np.uint8)
+    cv2.rectangle(image, (140, 130), (500, 355), (235, 235, 235), -1)
+    cv2.putText(image, "WARMUP 0000", (190, 250), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (30, 30, 30), 2)
+
+    docs: list[np.ndarray] = []
+    for mode in ("soft", "hard"):
+        _encode_preview_jpeg(_enhance_full_image(image, mode))
+        docs.extend(
+            process_image_to_documents(
+                image, max_docs=1, enhance_mode=mode, output_size=DOCUMENT_OUTPUT_SIZE
+            )
+        )
+    decode_image(_encode_preview_jpeg(docs[0]))
+    create_single_page_pdf_bytes(images_bgr=docs, **PDF_LAYOUT)
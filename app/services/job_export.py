@@ -0,0 +1,64 @@
+"""Bulk export of generated PDFs as a ZIP streamed while it is written.
+
+``zipfile`` writes to a non-seekable sink by emitting a data descriptor after
+each entry instead of seeking back to patch the header, so the archive can be
+sent chunk by chunk. Entries are stored, not deflated: the PDFs are already
+compressed and deflating them again only costs CPU. Only one PDF is held in
+memory at a time.
+"""
+import io
+import os
+import zipfile
+from datetime import datetime
+from typing import Iterable, Iterator
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, non-seekable buffer that hands out what was written so far."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def unique_name(name: str, used: set[str]) -> str:
+    """Return ``name`` or ``name (2)``, ``name (3)``... not yet in ``used``."""
+    stem, ext = os.path.splitext(name)
+    candidate = name
+    counter = 2
+    while candidate.lower() in used:
+        candidate = f"{stem} ({counter}){ext}"
+        counter += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def iter_zip(entries: Iterable[tuple[str, datetime | None, bytes]]) -> Iterator[bytes]:
+    """Yield a ZIP archive of ``(name, timestamp, data)`` entries as it is built."""
+    sink = _ChunkSink()
+    used: set[str] = set()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for name, timestamp, data in entries:
+            info = zipfile.ZipInfo(
+                unique_name(name, used),
+                date_time=(timestamp or datetime.utcnow()).timetuple()[:6],
+            )
+            info.compress_type = zipfile.ZIP_STORED
+            # Above 2 GiB the local header needs the ZIP64 extra field up front.
+            with archive.open(info, mode="w", force_zip64=len(data) > 0x7FFFFFFF) as entry:
+                entry.write(data)
+            yield sink.drain()
+    # Closing the archive writes the central directory.
+    yield sink.drain()
@@ -0,0 +1,111 @@
+"""Cold storage for the PDFs of old jobs.
+
+PDFs are zlib-compressed and appended to segment files
+(``segment_000001.bin``, ...) that are never rewritten; a segment is closed
+once it passes ``max_segment_bytes``. Each record's offset and length are kept
+on the job row, so reading one back is a single seek and read. Every segment
+also has a sidecar index (``segment_000001.idx``, one
+``job_id offset length size`` line per record) so the archive can be checked
+or re-linked without the database.
+
+Records are fsynced before the caller points rows at them: after a crash a
+segment may hold records no row uses, never a row pointing at missing bytes.
+"""
+import fcntl
+import os
+import re
+import zlib
+
+
+SEGMENT_PREFIX = "segment_"
+_SEGMENT_RE = re.compile(r"^segment_(\d{6})\.bin$")
+_LOCK_FILENAME = ".archive.lock"
+
+
+def _segment_path(archive_dir: str, segment: str) -> str:
+    # Segment names come from the database; never let one leave the archive.
+    if not _SEGMENT_RE.match(segment):
+        raise ValueError(f"Segmento de archivo invalido: {segment}")
+    return os.path.join(archive_dir, segment)
+
+
+def read_pdf(archive_dir: str, segment: str, offset: int, length: int) -> bytes:
+    """Return the PDF stored at ``offset`` in ``segment``."""
+    with open(_segment_path(archive_dir, segment), "rb") as fh:
+        fh.seek(offset)
+        data = fh.read(length)
+    if len(data) != length:
+        raise ValueError(f"Registro incompleto en {segment} (offset {offset}).")
+    return zlib.decompress(data)
+
+
+def read_job_pdf(job, archive_dir: str) -> bytes | None:
+    """The job's PDF from the archive if it was moved there, else from the row."""
+    if job.archive_segment:
+        return read_pdf(archive_dir, job.archive_segment, job.archive_offset, job.archive_length)
+    return job.pdf_data
+
+
+class ArchiveWriter:
+    """Appends PDFs to the newest segment; one writer per archive at a time.
+
+    Use as a context manager. ``append`` returns where the record went;
+    ``sync`` makes everything appended so far durable.
+    """
+
+    def __init__(self, archive_dir: str, max_segment_bytes: int):
+        self.archive_dir = archive_dir
+        self.max_segment_bytes = max_segment_bytes
+        self._lock = None
+        self._data = None
+        self._index = None
+        self.segment = None
+
+    def __enter__(self):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        self._lock = open(os.path.join(self.archive_dir, _LOCK_FILENAME), "w")
+        try:
+            fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock.close()
+            raise ValueError("Ya hay otro proceso archivando PDFs.")
+        numbers = [
+            int(match.group(1))
+            for match in map(_SEGMENT_RE.match, os.listdir(self.archive_dir))
+            if match
+        ]
+        self._open(max(numbers, default=1))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._close()
+        self._lock.close()
+
+    def _open(self, number: int) -> None:
+        self.segment = f"{SEGMENT_PREFIX}{number:06d}.bin"
+        path = os.path.join(self.archive_dir, self.segment)
+        self._data = open(path, "ab")
+        self._index = open(f"{path[:-4]}.idx", "a", encoding="ascii")
+
+    def _close(self) -> None:
+        if self._data is not None:
+            self.sync()
+            self._data.close()
+            self._index.close()
+            self._data = self._index = None
+
+    def append(self, job_id: int, pdf_bytes: bytes) -> tuple[str, int, int]:
+        """Append one PDF; return ``(segment, offset, length)``."""
+        if self._data.tell() >= self.max_segment_bytes:
+            self._close()
+            self._open(int(_SEGMENT_RE.match(self.segment).group(1)) + 1)
+        record = zlib.compress(pdf_bytes, 6)
+        offset = self._data.tell()
+        self._data.write(record)
+        self._index.write(f"{job_id} {offset} {len(record)} {len(pdf_bytes)}\n")
+        return self.segment, offset, len(record)
+
+    def sync(self) -> None:
+        for fh in (self._data, self._index):
+            fh.flush()
+            os.fsync(fh.fileno())
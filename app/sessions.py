@@ -0,0 +1,158 @@
+"""Server-side session storage backed by a dedicated SQLite database."""
+import os
+import random
+import sqlite3
+import threading
+import time
+from datetime import timedelta as TimeDelta
+from typing import Optional
+
+from flask import Flask
+from flask_session import Session
+from flask_session.base import ServerSideSession, ServerSideSessionInterface
+from flask_session.defaults import Defaults
+from itsdangerous import want_bytes
+
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS sessions ("
+    "id TEXT PRIMARY KEY, "
+    "data BLOB NOT NULL, "
+    "expiry INTEGER NOT NULL"
+    ")",
+    "CREATE INDEX IF NOT EXISTS ix_sessions_expiry ON sessions (expiry)",
+)
+
+
+class SqliteSession(ServerSideSession):
+    pass
+
+
+class SqliteSessionInterface(ServerSideSessionInterface):
+    """Stores sessions as rows keyed by session id in a SQLite file.
+
+    Loads and saves are primary-key lookups, and expired rows are swept in
+    bounded batches through the ``expiry`` index, so the cost of a request
+    does not grow with the number of live sessions.
+    """
+
+    session_class = SqliteSession
+    ttl = False
+
+    def __init__(
+        self,
+        app: Flask,
+        path: str,
+        key_prefix: str = Defaults.SESSION_KEY_PREFIX,
+        use_signer: bool = Defaults.SESSION_USE_SIGNER,
+        permanent: bool = Defaults.SESSION_PERMANENT,
+        sid_length: int = Defaults.SESSION_ID_LENGTH,
+        serialization_format: str = Defaults.SESSION_SERIALIZATION_FORMAT,
+        cleanup_n_requests: Optional[int] = 100,
+        cleanup_batch_size: int = 500,
+    ):
+        self.path = path
+        self.cleanup_batch_size = max(1, cleanup_batch_size)
+        self._local = threading.local()
+
+        db_dir = os.path.dirname(path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        conn = self._connect()
+        with conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+
+        super().__init__(
+            app,
+            key_prefix,
+            use_signer,
+            permanent,
+            sid_length,
+            serialization_format,
+            cleanup_n_requests,
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread and per process: gunicorn forks workers
+        # after the app is created, and sqlite3 connections must not cross a fork.
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _retrieve_session_data(self, store_id: str) -> Optional[dict]:
+        row = self._connect().execute(
+            "SELECT data FROM sessions WHERE id = ? AND expiry > ?",
+            (store_id, int(time.time())),
+        ).fetchone()
+        if row is None:
+            return None
+        return self.serializer.decode(want_bytes(row[0]))
+
+    def _delete_session(self, store_id: str) -> None:
+        self._connect().execute("DELETE FROM sessions WHERE id = ?", (store_id,))
+
+    def _upsert_session(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        expiry = int(time.time() + session_lifetime.total_seconds())
+        self._connect().execute(
+            "INSERT INTO sessions (id, data, expiry) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET data = excluded.data, expiry = excluded.expiry",
+            (store_id, self.serializer.encode(session), expiry),
+        )
+
+    def _delete_expired_sessions(self) -> None:
+        self.delete_expired()
+
+    def delete_expired(self, max_batches: Optional[int] = None) -> int:
+        """Delete expired rows in batches so each write lock stays short."""
+        conn = self._connect()
+        now = int(time.time())
+        deleted = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            cursor = conn.execute(
+                "DELETE FROM sessions WHERE rowid IN ("
+                "SELECT rowid FROM sessions WHERE expiry <= ? LIMIT ?)",
+                (now, self.cleanup_batch_size),
+            )
+            deleted += cursor.rowcount
+            batches += 1
+            if cursor.rowcount < self.cleanup_batch_size:
+                break
+        return deleted
+
+    def _cleanup_n_requests(self) -> None:
+        # Request-path sweeps only take one batch; the CLI drains the rest.
+        if self.cleanup_n_requests and random.randint(0, self.cleanup_n_requests) == 0:
+            self.delete_expired(max_batches=1)
+
+
+class SessionStore(Session):
+    """Flask-Session extension that also understands ``SESSION_TYPE = "sqlite"``."""
+
+    def _get_interface(self, app):
+        config = app.config
+        if config.get("SESSION_TYPE", "").lower() != "sqlite":
+            return super()._get_interface(app)
+
+        return SqliteSessionInterface(
+            app=app,
+            path=config["SESSION_SQLITE_PATH"],
+            key_prefix=config.get("SESSION_KEY_PREFIX", Defaults.SESSION_KEY_PREFIX),
+            use_signer=config.get("SESSION_USE_SIGNER", Defaults.SESSION_USE_SIGNER),
+            permanent=config.get("SESSION_PERMANENT", Defaults.SESSION_PERMANENT),
+            sid_length=config.get("SESSION_ID_LENGTH", Defaults.SESSION_ID_LENGTH),
+            serialization_format=config.get(
+                "SESSION_SERIALIZATION_FORMAT", Defaults.SESSION_SERIALIZATION_FORMAT
+            ),
+            cleanup_n_requests=config.get("SESSION_CLEANUP_N_REQUESTS"),
+            cleanup_batch_size=config.get("SESSION_CLEANUP_BATCH_SIZE", 500),
+        )
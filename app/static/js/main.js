@@ -476,6 +476,7 @@ let cropStart = null;
 let cropDragging = false;
 let cropDrawState = null;
 let cropCanvasBase = null;
+let cropPendingBase = null;
 const CROP_MAX_WIDTH = 680;
 const CROP_MAX_HEIGHT = 520;
 const MAX_IMG_FILES = 6;
@@ -549,7 +550,16 @@ if (imgUploadList) {
 
 renderUploadList();
 
+// Sent as Idempotency-Key and kept until the previews or the filename change,
+// so double clicks and retries of the same PDF map to a single job.
+let imgGenerateKey = null;
+const newIdempotencyKey = () =>
+  window.crypto?.randomUUID
+    ? window.crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
 const renderPreviewGrid = () => {
+  imgGenerateKey = null;
   if (!imgPreviewGrid) {
     return;
   }
@@ -582,6 +592,7 @@ const openCropModal = (index) => {
     return;
   }
   activeCropIndex = index;
+  cropPendingBase = null;
   cropRect = null;
   cropStart = null;
   cropDragging = false;
@@ -732,6 +743,25 @@ if (cropApplyBtn) {
     const sy = (rect.y - drawRect.y) / cropDrawState.scale;
     const sw = rect.w / cropDrawState.scale;
     const sh = rect.h / cropDrawState.scale;
+    const item = previewItems[activeCropIndex];
+    // The server re-applies the crop to its full-resolution copy; the canvas
+    // result below is only for display.
+    const cropOp = {
+      op: "crop",
+      rect: [
+        sx / cropImage.width,
+        sy / cropImage.height,
+        sw / cropImage.width,
+        sh / cropImage.height,
+      ],
+    };
+    if (cropPendingBase === "source") {
+      item.base = "source";
+      item.ops = [cropOp];
+    } else {
+      item.ops.push(cropOp);
+    }
+    cropPendingBase = null;
 
     const output = document.createElement("canvas");
     output.width = Math.max(1, Math.floor(sw));
@@ -741,7 +771,9 @@ if (cropApplyBtn) {
       return;
     }
     ctx.drawImage(cropImage, sx, sy, sw, sh, 0, 0, output.width, output.height);
-    previewItems[activeCropIndex].editedUrl = output.toDataURL("image/png");
+    item.editedUrl = item.token
+      ? output.toDataURL("image/jpeg", 0.85)
+      : output.toDataURL("image/png");
     cropRect = null;
     cropStart = null;
     if (cropImage) {
@@ -753,7 +785,7 @@ if (cropApplyBtn) {
   });
 }
 
-const rotateDataUrl = (dataUrl, direction) =>
+const rotateDataUrl = (dataUrl, direction, type = "image/png") =>
   new Promise((resolve, reject) => {
     const image = new Image();
     image.onload = () => {
@@ -768,7 +800,7 @@ const rotateDataUrl = (dataUrl, direction) =>
       ctx.translate(canvas.width / 2, canvas.height / 2);
       ctx.rotate(direction === "left" ? -Math.PI / 2 : Math.PI / 2);
       ctx.drawImage(image, -image.width / 2, -image.height / 2);
-      resolve(canvas.toDataURL("image/png"));
+      resolve(canvas.toDataURL(type, 0.85));
     };
     image.onerror = () => reject(new Error("No se pudo rotar la imagen."));
     image.src = dataUrl;
@@ -785,11 +817,15 @@ if (cropRotateButtons.length) {
         return;
       }
       try {
+        const item = previewItems[activeCropIndex];
         const rotatedUrl = await rotateDataUrl(
-          previewItems[activeCropIndex].editedUrl,
-          direction
+          item.editedUrl,
+          direction,
+          item.token ? "image/jpeg" : "image/png"
         );
-        previewItems[activeCropIndex].editedUrl = rotatedUrl;
+        item.editedUrl = rotatedUrl;
+        item.ops.push({ op: "rotate", quadrant: direction === "left" ? -1 : 1 });
+        cropPendingBase = null;
         cropRect = null;
         if (cropImage) {
           cropImage.src = rotatedUrl;
@@ -808,6 +844,9 @@ if (cropResetBtn) {
       return;
     }
     previewItems[activeCropIndex].editedUrl = previewItems[activeCropIndex].baseUrl;
+    previewItems[activeCropIndex].base = "document";
+    previewItems[activeCropIndex].ops = [];
+    cropPendingBase = null;
     cropRect = null;
     if (cropImage) {
       cropImage.src = previewItems[activeCropIndex].editedUrl;
@@ -823,6 +862,8 @@ if (cropRestartBtn) {
     }
     cropRect = null;
     cropStart = null;
+    // Applies once the user confirms a crop on the full frame.
+    cropPendingBase = "source";
     const sourceUrl =
       previewItems[activeCropIndex].fullUrl ||
       previewItems[activeCropIndex].baseUrl;
@@ -856,6 +897,96 @@ const setGenerateLoading = (loading) => {
   imgGenerateBtn.textContent = loading ? "Generando..." : "Generar PDF";
 };
 
+const uploadMaxEdge = Number.parseInt(imgForm?.dataset.uploadMaxEdge || "0", 10) || 0;
+const uploadJpegQuality =
+  (Number.parseInt(imgForm?.dataset.uploadJpegQuality || "90", 10) || 90) / 100;
+
+// Downscale to the size advertised by the server and re-encode as JPEG.
+// Drawing the decoded bitmap applies EXIF orientation and drops metadata.
+// Any failure falls back to uploading the original file.
+const prepareUpload = async (file) => {
+  if (!uploadMaxEdge || typeof createImageBitmap !== "function" || !file.type.startsWith("image/")) {
+    return file;
+  }
+  let bitmap = null;
+  try {
+    bitmap = await createImageBitmap(file, { imageOrientation: "from-image" });
+    const scale = Math.min(1, uploadMaxEdge / Math.max(bitmap.width, bitmap.height));
+    if (scale === 1 && file.type === "image/jpeg") {
+      return file;
+    }
+    const width = Math.max(1, Math.round(bitmap.width * scale));
+    const height = Math.max(1, Math.round(bitmap.height * scale));
+    let blob;
+    if (typeof OffscreenCanvas === "function") {
+      const canvas = new OffscreenCanvas(width, height);
+      canvas.getContext("2d").drawImage(bitmap, 0, 0, width, height);
+      blob = await canvas.convertToBlob({ type: "image/jpeg", quality: uploadJpegQuality });
+    } else {
+      const canvas = document.createElement("canvas");
+      canvas.width = width;
+      canvas.height = height;
+      canvas.getContext("2d").drawImage(bitmap, 0, 0, width, height);
+      blob = await new Promise((resolve) =>
+        canvas.toBlob(resolve, "image/jpeg", uploadJpegQuality)
+      );
+    }
+    if (!blob || blob.size >= file.size) {
+      return file;
+    }
+    const name = file.name.replace(/\.[^.]+$/, "") + ".jpg";
+    return new File([blob], name, { type: "image/jpeg", lastModified: file.lastModified });
+  } catch (error) {
+    return file;
+  } finally {
+    if (bitmap) {
+      bitmap.close();
+    }
+  }
+};
+
+const mergePreviewItems = (newItems) => {
+  const combined = previewItems.concat(newItems);
+  const ordered = [];
+  const orderedKeys = selectedFiles.map((file) => buildFileKey(file));
+  orderedKeys.forEach((key) => {
+    combined
+      .filter((item) => item.sourceKey === key)
+      .forEach((item) => ordered.push(item));
+  });
+  combined
+    .filter((item) => !item.sourceKey)
+    .forEach((item) => ordered.push(item));
+  previewItems = ordered;
+  renderPreviewGrid();
+};
+
+const readNdjson = async (response, onEvent) => {
+  const handleLine = (line) => {
+    if (line.trim()) {
+      onEvent(JSON.parse(line));
+    }
+  };
+  if (!response.body || !window.TextDecoder) {
+    (await response.text()).split("\n").forEach(handleLine);
+    return;
+  }
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { done, value } = await reader.read();
+    buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+    const lines = buffer.split("\n");
+    buffer = lines.pop();
+    lines.forEach(handleLine);
+    if (done) {
+      handleLine(buffer);
+      return;
+    }
+  }
+};
+
 if (imgPreviewBtn && imgForm) {
   imgPreviewBtn.addEventListener("click", async () => {
     if (!selectedFiles.length) {
@@ -875,13 +1006,14 @@ if (imgPreviewBtn && imgForm) {
     const formData = new FormData();
     formData.set("enhance_mode", imgEnhanceSelect?.value || "soft");
     const filesToSend = pendingFiles.length ? pendingFiles : selectedFiles;
-    filesToSend.forEach((file) => {
-      formData.append("images", file);
-      formData.append("file_keys", buildFileKey(file));
-    });
     setPreviewLoading(true);
     try {
-      const response = await fetch("/tools/img-to-pdf/preview", {
+      // One at a time: each decoded bitmap can take ~50 MB on a phone.
+      for (const file of filesToSend) {
+        formData.append("images", await prepareUpload(file));
+        formData.append("file_keys", buildFileKey(file));
+      }
+      const response = await fetch("/tools/img-to-pdf/preview/stream", {
         method: "POST",
         body: formData,
         headers: {
@@ -889,30 +1021,33 @@ if (imgPreviewBtn && imgForm) {
           "X-CSRFToken": getImgPdfCsrf(),
         },
       });
-      const payload = await safeJson(response);
       if (!response.ok) {
+        const payload = await safeJson(response);
         throw new Error(payload.error || "No se pudo procesar las imagenes.");
       }
-      const newItems = payload.previews.map((item) => ({
-        id: item.id,
-        sourceKey: item.source_key || null,
-        baseUrl: item.data_url,
-        fullUrl: item.full_data_url || item.data_url,
-        editedUrl: item.data_url,
-      }));
-      const combined = previewItems.concat(newItems);
-      const ordered = [];
-      const orderedKeys = selectedFiles.map((file) => buildFileKey(file));
-      orderedKeys.forEach((key) => {
-        combined
-          .filter((item) => item.sourceKey === key)
-          .forEach((item) => ordered.push(item));
+      const sources = {};
+      await readNdjson(response, (event) => {
+        if (event.type === "source") {
+          sources[event.source_id] = event;
+        } else if (event.type === "document") {
+          const source = sources[event.source_id] || {};
+          mergePreviewItems([
+            {
+              id: event.id,
+              sourceKey: event.source_key || null,
+              baseUrl: event.data_url,
+              fullUrl: source.full_data_url || event.data_url,
+              editedUrl: event.data_url,
+              token: event.token || null,
+              sourceToken: source.token || null,
+              base: "document",
+              ops: [],
+            },
+          ]);
+        } else if (event.type === "error") {
+          throw new Error(event.error || "No se pudo procesar las imagenes.");
+        }
       });
-      combined
-        .filter((item) => !item.sourceKey)
-        .forEach((item) => ordered.push(item));
-      previewItems = ordered;
-      renderPreviewGrid();
     } catch (error) {
       showToast(error.message);
     } finally {
@@ -921,12 +1056,19 @@ if (imgPreviewBtn && imgForm) {
   });
 }
 
+if (imgFilenameInput) {
+  imgFilenameInput.addEventListener("input", () => {
+    imgGenerateKey = null;
+  });
+}
+
 if (imgGenerateBtn) {
   imgGenerateBtn.addEventListener("click", async () => {
     if (!previewItems.length) {
       return;
     }
     const filename = imgFilenameInput?.value || "";
+    imgGenerateKey = imgGenerateKey || newIdempotencyKey();
     setGenerateLoading(true);
     try {
       const response = await fetch("/tools/img-to-pdf/generate", {
@@ -935,9 +1077,13 @@ if (imgGenerateBtn) {
           "Content-Type": "application/json",
           "X-Requested-With": "fetch",
           "X-CSRFToken": getImgPdfCsrf(),
+          "Idempotency-Key": imgGenerateKey,
         },
         body: JSON.stringify({
-          images: previewItems.map((item) => item.editedUrl),
+          documents: previewItems.map((item) => {
+            const token = item.base === "source" ? item.sourceToken : item.token;
+            return token ? { token, ops: item.ops } : { data_url: item.editedUrl };
+          }),
           filename,
         }),
       });
@@ -945,7 +1091,8 @@ if (imgGenerateBtn) {
       if (!response.ok) {
         throw new Error(payload.error || "No se pudo generar el PDF.");
       }
-      if (payload.row_html && imgTableBody) {
+      const existingRow = imgTableBody?.querySelector(`tr[data-job-id="${payload.job_id}"]`);
+      if (payload.row_html && imgTableBody && !existingRow) {
         const wrapper = document.createElement("tbody");
         wrapper.innerHTML = payload.row_html.trim();
         const newRow = wrapper.querySelector("tr");
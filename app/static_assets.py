@@ -0,0 +1,97 @@
+"""Content-hashed static files, built at startup for nginx to serve.
+
+With ``STATIC_FINGERPRINT`` on, every file under ``app/static`` is copied to
+``STATIC_BUILD_DIR`` twice: under its own name and with the first 12 hex
+digits of its SHA-256 before the extension (``js/main.3f9c0a1b2d4e.js``).
+Text assets also get a gzip-compressed ``.gz`` twin for nginx's
+``gzip_static``. ``manifest.json`` maps each original name to its hashed one
+and ``url_for('static', ...)`` emits the hashed URL, so a deploy changes every
+URL whose file changed and browsers can cache the rest forever.
+
+Hashed files of earlier builds are kept: pages rendered before a restart
+still point at them. Writes go through a temporary file and a rename, so
+workers building at the same time never expose a partial file.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+
+from flask import request
+
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "manifest.json"
+HASH_LENGTH = 12
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+_COMPRESSIBLE = {".css", ".js", ".json", ".map", ".svg", ".txt"}
+_HASHED_RE = re.compile(r"\.[0-9a-f]{%d}\.[A-Za-z0-9]+$" % HASH_LENGTH)
+
+
+def _write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp_path, path)
+
+
+def _write_with_gzip(build_dir: str, name: str, data: bytes, overwrite: bool) -> None:
+    path = os.path.join(build_dir, name)
+    if not overwrite and os.path.exists(path):
+        return
+    if os.path.splitext(name)[1] in _COMPRESSIBLE:
+        # mtime=0 keeps the .gz identical across builds.
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) < len(data):
+            _write(f"{path}.gz", compressed)
+    _write(path, data)
+
+
+def build(static_dir: str, build_dir: str) -> dict[str, str]:
+    """Copy ``static_dir`` into ``build_dir`` with hashed names; return the manifest."""
+    manifest: dict[str, str] = {}
+    for dirpath, _, filenames in os.walk(static_dir):
+        for filename in sorted(filenames):
+            source = os.path.join(dirpath, filename)
+            name = os.path.relpath(source, static_dir).replace(os.sep, "/")
+            with open(source, "rb") as fh:
+                data = fh.read()
+            stem, ext = os.path.splitext(name)
+            hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+            _write_with_gzip(build_dir, hashed, data, overwrite=False)
+            _write_with_gzip(build_dir, name, data, overwrite=True)
+            manifest[name] = hashed
+    _write(
+        os.path.join(build_dir, MANIFEST_FILENAME),
+        json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"),
+    )
+    return manifest
+
+
+def init_app(app) -> None:
+    if not app.config.get("STATIC_FINGERPRINT"):
+        return
+
+    build_dir = app.config["STATIC_BUILD_DIR"]
+    try:
+        manifest = build(app.static_folder, build_dir)
+    except OSError:
+        logger.exception("Could not build fingerprinted static files in %s", build_dir)
+        return
+    # Flask serves the build too, for requests that reach it directly.
+    app.static_folder = build_dir
+
+    @app.url_defaults
+    def _fingerprint_static_url(endpoint, values):
+        if endpoint == "static" and "filename" in values:
+            values["filename"] = manifest.get(values["filename"], values["filename"])
+
+    @app.after_request
+    def _cache_fingerprinted(response):
+        if request.endpoint == "static" and _HASHED_RE.search(request.path):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
@@ -0,0 +1,65 @@
+"""Gunicorn settings shared by the Docker image and local runs.
+
+Command-line flags and ``GUNICORN_CMD_ARGS`` still override these values.
+"""
+import logging
+import os
+import shutil
+import time
+
+# Prometheus multiprocess mode: every worker writes its samples here and
+# /metrics merges them. Must be set before the app imports prometheus_client,
+# and wiped here because preload_app creates the app before on_starting runs.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/quatro_gnc_metrics")
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() == "true"
+
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+# Load the app once in the master so workers share its pages copy-on-write.
+preload_app = _env_bool("GUNICORN_PRELOAD", "true")
+
+# Recycle workers after N requests (0 disables) to bound heap fragmentation
+# left behind by large image buffers. Jitter keeps workers from restarting together.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "500"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "50"))
+
+# Run a synthetic image through the CV pipeline before a worker accepts traffic.
+warmup = _env_bool("GUNICORN_WARMUP", "true")
+
+logger = logging.getLogger("gunicorn.error")
+
+
+def when_ready(server):
+    if preload_app and warmup:
+        # Import the CV stack in the master so its code and static data are
+        # shared copy-on-write. Only import: OpenCV thread pools must be
+        # created after fork, so the warm-up itself runs in each worker.
+        import app.services.img_to_pdf  # noqa: F401
+
+
+def post_worker_init(worker):
+    if not warmup:
+        return
+    from app.services.img_to_pdf import warm_up
+
+    start = time.perf_counter()
+    try:
+        warm_up()
+    except Exception:
+        logger.exception("Worker %s warm-up failed", worker.pid)
+        return
+    logger.info("Worker %s warmed up in %.0f ms", worker.pid, (time.perf_counter() - start) * 1000)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
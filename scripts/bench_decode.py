@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Compare the upload decoders: Pillow chain vs. cv2.imdecode fast path.
+
+For each photo size a synthetic card photo is saved as a JPEG tagged with
+EXIF orientation 6 (the usual portrait phone shot), then every decoder runs
+in a fresh interpreter so its peak RSS (VmHWM; ru_maxrss would inherit the
+parent's across exec) is not polluted by the previous one. Reports median
+latency and peak memory above the baseline taken after the file is loaded.
+Linux only.
+
+Usage:
+    python scripts/bench_decode.py
+    python scripts/bench_decode.py --sizes 12 48 --repeat 5
+"""
+
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DECODERS = {
+    "pil": "app.services.img_pdf.image_decoder:_decode_with_pil",
+    "cv2": "app.services.img_pdf.image_decoder:decode_image",
+}
+
+# 4:3 photo sizes by megapixels.
+SIZES = {12: (4000, 3000), 48: (8000, 6000)}
+
+_CHILD = """
+import importlib, json, statistics, sys, time
+sys.path.insert(0, {root!r})
+
+def hwm_kb():
+    with open("/proc/self/status") as fh:
+        return next(int(line.split()[1]) for line in fh if line.startswith("VmHWM:"))
+
+module, _, name = {target!r}.partition(":")
+decode = getattr(importlib.import_module(module), name)
+data = open({path!r}, "rb").read()
+base = hwm_kb()
+times = []
+for _ in range({repeat}):
+    start = time.perf_counter()
+    image = decode(data)
+    times.append((time.perf_counter() - start) * 1000)
+    del image
+peak = hwm_kb()
+print(json.dumps({{"ms": statistics.median(times), "peak_mb": (peak - base) / 1024}}))
+"""
+
+
+def _make_photo(path: str, width: int, height: int) -> None:
+    import cv2
+    from PIL import Image
+
+    from synthetic_images import card_photo
+
+    image, _ = card_photo(width, height, cards=2, seed=11)
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)).save(
+        buffer, "JPEG", quality=92, exif=exif.tobytes()
+    )
+    with open(path, "wb") as fh:
+        fh.write(buffer.getvalue())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark upload decoders.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=sorted(SIZES), choices=sorted(SIZES))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mp in args.sizes:
+            path = os.path.join(tmp, f"{mp}mp.jpg")
+            _make_photo(path, *SIZES[mp])
+            size_mb = os.path.getsize(path) / 1_000_000
+            print(f"{mp} MP JPEG ({size_mb:.1f} MB, EXIF orientation 6)")
+            for label, target in DECODERS.items():
+                code = _CHILD.format(root=ROOT, target=target, path=path, repeat=args.repeat)
+                out = subprocess.run(
+                    [sys.executable, "-c", code], check=True, capture_output=True, text=True
+                ).stdout
+                result = json.loads(out)
+                print(f"  {label:<4} {result['ms']:8.0f} ms   peak +{result['peak_mb']:6.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Latency and recall of document detection, cascade vs. full pass only.
+
+Runs ``process_image_to_documents`` over a labelled set of synthetic card
+photos (see synthetic_images.py: 1-4 cards, random tilt/perspective, 12 MP)
+and matches detected quads to the ground truth by polygon IoU.
+
+Reports per mode:
+  - recall:      ground-truth cards matched with IoU >= --iou
+  - extra:       detections matching no card
+  - suppressed:  duplicate candidates dropped by NMS before warping
+  - levels:      which cascade level produced the result
+  - detect p50 / p95 and total p50 (detection + warp + enhance), in ms
+
+Usage:
+    python scripts/bench_detection.py
+    python scripts/bench_detection.py --photos 60 --iou 0.6
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+import cv2
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.img_pdf.image_processor import (  # noqa: E402
+    FAST_PASS_DIM,
+    process_image_to_documents,
+)
+from synthetic_images import card_photo  # noqa: E402
+
+MODES = {"cascade": FAST_PASS_DIM, "full only": None}
+
+
+def quad_iou(a: np.ndarray, b: np.ndarray) -> float:
+    a = a.astype(np.float32)
+    b = b.astype(np.float32)
+    inter, _ = cv2.intersectConvexConvex(a, b)
+    union = cv2.contourArea(a) + cv2.contourArea(b) - inter
+    return float(inter / union) if union > 0 else 0.0
+
+
+def labelled_set(count: int, width: int, height: int):
+    for seed in range(count):
+        cards = 1 + seed % 4
+        w, h = (width, height) if seed % 3 else (height, width)
+        yield card_photo(w, h, cards=cards, seed=seed)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark document detection.")
+    parser.add_argument("--photos", type=int, default=40)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--iou", type=float, default=0.5)
+    args = parser.parse_args()
+
+    photos = list(labelled_set(args.photos, args.width, args.height))
+    # Warm OpenCV up so the first photo of the first mode is not penalised.
+    process_image_to_documents(photos[0][0], max_docs=6)
+
+    for mode, fast_pass_dim in MODES.items():
+        hits = extra = total_cards = suppressed = 0
+        levels: Counter = Counter()
+        detect_ms: list[float] = []
+        total_ms: list[float] = []
+        for image, truth in photos:
+            stats: dict = {}
+            start = time.perf_counter()
+            process_image_to_documents(image, max_docs=6, fast_pass_dim=fast_pass_dim, stats=stats)
+            total_ms.append((time.perf_counter() - start) * 1000)
+            detect_ms.append(stats["detect_ms"])
+            levels[stats["detection_level"]] += 1
+            suppressed += stats["suppressed"]
+
+            detected = list(stats["quads"])
+            total_cards += len(truth)
+            for quad in truth:
+                scores = [quad_iou(quad, found) for found in detected]
+                if scores and max(scores) >= args.iou:
+                    hits += 1
+                    detected.pop(int(np.argmax(scores)))
+            extra += len(detected)
+
+        print(f"{mode}")
+        print(
+            f"  recall {hits}/{total_cards} ({100.0 * hits / total_cards:.1f}%)"
+            f" | extra {extra} | suppressed {suppressed}"
+        )
+        print(f"  levels {dict(levels)}")
+        print(
+            f"  detect p50 {statistics.median(detect_ms):.1f} ms, p95 {percentile(detect_ms, 95):.1f} ms"
+            f" | total p50 {statistics.median(total_ms):.0f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Measure gunicorn cold start: boot time, first preview latency and memory.
+
+Boots gunicorn with ``gunicorn.conf.py`` twice against a temporary SQLite
+database: once with preload and warm-up disabled (the previous behaviour)
+and once with the defaults, then reports:
+  - ready_s:      seconds until /login answers
+  - first_ms:     latency of the first /tools/img-to-pdf/preview
+  - warm_ms:      median latency of the following previews
+  - RSS / PSS:    per worker, from /proc/<pid>/smaps_rollup (Linux only);
+                  PSS splits pages shared copy-on-write with the master.
+
+Usage:
+    python scripts/bench_gunicorn_start.py
+    python scripts/bench_gunicorn_start.py --workers 2 --port 5099
+"""
+
+import argparse
+import http.cookiejar
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_images import card_photo, encode_jpeg  # noqa: E402
+
+MODES = {
+    "cold (no preload, no warm-up)": {"GUNICORN_PRELOAD": "false", "GUNICORN_WARMUP": "false"},
+    "preload + warm-up": {"GUNICORN_PRELOAD": "true", "GUNICORN_WARMUP": "true"},
+}
+
+
+def _multipart(fields: dict, files: list[tuple[str, str, bytes, str]]) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    for name, filename, data, mimetype in files:
+        parts.append(
+            (
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                f'filename="{filename}"\r\nContent-Type: {mimetype}\r\n\r\n'
+            ).encode()
+            + data
+            + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def _memory(pid: int) -> dict:
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as fh:
+            for line in fh:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss"):
+                    values[key] = int(rest.split()[0]) // 1024
+    except OSError:
+        pass
+    return values
+
+
+def _children(pid: int) -> list[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as fh:
+                fields = fh.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+
+def run_mode(name: str, overrides: dict, args, photo: bytes) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.update(
+            {
+                "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'app.db')}",
+                "SESSION_SQLITE_PATH": os.path.join(tmp, "sessions.db"),
+                "PROMETHEUS_MULTIPROC_DIR": os.path.join(tmp, "metrics"),
+                "WTF_CSRF_ENABLED": "false",
+                "ALLOW_SEED_DEMO": "true",
+                "DEFAULT_ADMIN_USER": "bench",
+                "DEFAULT_ADMIN_PASSWORD": "bench-pass",
+                "GUNICORN_BIND": f"127.0.0.1:{args.port}",
+                "GUNICORN_WORKERS": str(args.workers),
+                **overrides,
+            }
+        )
+        subprocess.run(
+            [sys.executable, "-m", "flask", "--app", "run.py", "seed-db"],
+            cwd=ROOT, env=env, check=True, capture_output=True,
+        )
+
+        base = f"http://127.0.0.1:{args.port}"
+        start = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            opener = urllib.request.build_opener(
+                urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+            )
+            while True:
+                try:
+                    opener.open(f"{base}/login", timeout=1).read()
+                    break
+                except OSError:  # refused, reset or timed out while workers boot
+                    if time.perf_counter() - start > 120:
+                        raise RuntimeError("gunicorn did not start")
+                    time.sleep(0.05)
+            ready_s = time.perf_counter() - start
+
+            # Workers may still be warming up; wait until they all finished
+            # booting so the measurement matches "first request after deploy".
+            time.sleep(args.settle)
+            opener.open(
+                f"{base}/login",
+                data=b"username=bench&password=bench-pass",
+                timeout=30,
+            ).read()
+
+            latencies = []
+            for _ in range(1 + args.repeat):
+                body, content_type = _multipart(
+                    {"enhance_mode": "soft"}, [("images", "photo.jpg", photo, "image/jpeg")]
+                )
+                req = urllib.request.Request(
+                    f"{base}/tools/img-to-pdf/preview",
+                    data=body,
+                    headers={"Content-Type": content_type, "X-Requested-With": "fetch"},
+                )
+                t0 = time.perf_counter()
+                opener.open(req, timeout=120).read()
+                latencies.append((time.perf_counter() - t0) * 1000)
+
+            workers = [_memory(pid) for pid in _children(server.pid)]
+            master = _memory(server.pid)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    return {
+        "mode": name,
+        "ready_s": ready_s,
+        "first_ms": latencies[0],
+        "warm_ms": statistics.median(latencies[1:]),
+        "master": master,
+        "workers": workers,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark gunicorn cold start.")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--repeat", type=int, default=4, help="Previews after the first one")
+    parser.add_argument("--settle", type=float, default=3.0, help="Seconds to wait after boot")
+    args = parser.parse_args()
+
+    image, _ = card_photo(4000, 3000, cards=2, seed=7)
+    photo = encode_jpeg(image)
+
+    for name, overrides in MODES.items():
+        r = run_mode(name, overrides, args, photo)
+        workers = ", ".join(
+            f"RSS {w.get('Rss', '?')} MB / PSS {w.get('Pss', '?')} MB" for w in r["workers"]
+        )
+        print(f"{r['mode']}")
+        print(f"  ready {r['ready_s']:.2f} s | first preview {r['first_ms']:.0f} ms | "
+              f"warm preview {r['warm_ms']:.0f} ms")
+        print(f"  master RSS {r['master'].get('Rss', '?')} MB | workers: {workers}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Compare per-request session overhead of the filesystem and SQLite backends.
+
+Each backend is pre-populated with N live sessions, then a request that reads
+and rewrites one of them is timed through the Flask test client.
+
+Usage:
+    python scripts/bench_sessions.py
+    python scripts/bench_sessions.py --sessions 1000 10000 --requests 500
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from datetime import timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from flask import Flask, session  # noqa: E402
+from flask_session.base import ServerSideSession  # noqa: E402
+from flask_session.filesystem import FileSystemSessionInterface  # noqa: E402
+
+from app.sessions import SqliteSessionInterface  # noqa: E402
+
+
+def _build_app(backend: str, workdir: str, live_sessions: int) -> Flask:
+    app = Flask(__name__)
+    app.secret_key = "bench"
+    app.permanent_session_lifetime = timedelta(days=1)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        if backend == "filesystem":
+            # Threshold must exceed the live count or cachelib evicts sessions.
+            interface = FileSystemSessionInterface(
+                app,
+                cache_dir=os.path.join(workdir, "flask_sessions"),
+                threshold=live_sessions * 2,
+                permanent=False,
+            )
+        else:
+            interface = SqliteSessionInterface(
+                app,
+                path=os.path.join(workdir, "sessions.db"),
+                permanent=False,
+                cleanup_n_requests=100,
+            )
+    app.session_interface = interface
+
+    @app.route("/")
+    def index():
+        session["hits"] = session.get("hits", 0) + 1
+        return "ok"
+
+    return app
+
+
+def _populate(app: Flask, live_sessions: int) -> str:
+    interface = app.session_interface
+    lifetime = app.permanent_session_lifetime
+    sid = ""
+    for idx in range(live_sessions):
+        sid = f"bench{idx:08d}"
+        data = ServerSideSession({"_user_id": str(idx), "hits": 0}, sid=sid)
+        interface._upsert_session(lifetime, data, interface._get_store_id(sid))
+    return sid
+
+
+def run(backend: str, live_sessions: int, requests: int) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        app = _build_app(backend, workdir, live_sessions)
+        start = time.perf_counter()
+        sid = _populate(app, live_sessions)
+        populate_s = time.perf_counter() - start
+
+        client = app.test_client()
+        client.set_cookie(app.config["SESSION_COOKIE_NAME"], sid)
+        timings = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = client.get("/")
+            timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f"{backend}: unexpected status {response.status_code}")
+
+    timings.sort()
+    return {
+        "backend": backend,
+        "sessions": live_sessions,
+        "populate_s": populate_s,
+        "p50_ms": statistics.median(timings),
+        "p95_ms": timings[int(len(timings) * 0.95) - 1],
+        "mean_ms": statistics.fmean(timings),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark session backends.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument(
+        "--backends", nargs="+", default=["filesystem", "sqlite"],
+        choices=["filesystem", "sqlite"],
+    )
+    args = parser.parse_args()
+
+    print(f"{'backend':<12}{'sessions':>10}{'populate s':>12}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for live in args.sessions:
+        for backend in args.backends:
+            r = run(backend, live, args.requests)
+            print(
+                f"{r['backend']:<12}{r['sessions']:>10}{r['populate_s']:>12.2f}"
+                f"{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['mean_ms']:>10.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
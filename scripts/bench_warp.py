@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Per-document cost of warp + enhance: native resolution vs. PDF slot size.
+
+Runs ``process_image_to_documents`` over synthetic 12 MP card photos (see
+synthetic_images.py; one card per photo by default, the usual ID shot), once
+warping every card at its native size in the photo (the previous behaviour)
+and once capped to ``DOCUMENT_OUTPUT_SIZE``, the size of a slot on the page.
+Each mode runs in a fresh interpreter so its peak RSS (VmHWM) is not
+polluted by the other one. Linux only.
+
+Reports per mode and enhance mode:
+  - ms/doc:   median wall time per extracted document (detection included)
+  - peak:     peak RSS above the baseline taken after the photos are built
+              (includes OpenCV's first-call allocations)
+  - size:     median output size of a document
+  - PSNR:     of the capped output against the native one after both are
+              fitted to the PDF slot (what ends up on the page)
+
+Usage:
+    python scripts/bench_warp.py
+    python scripts/bench_warp.py --photos 12 --cards 2
+"""
+
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+
+MODES = {"native": False, "slot size": True}
+
+_CHILD = """
+import json, pickle, statistics, sys, time
+sys.path.insert(0, {root!r})
+sys.path.insert(0, {scripts!r})
+import cv2
+import numpy as np
+from app.services.img_pdf.image_processor import process_image_to_documents
+from app.services.img_to_pdf import DOCUMENT_OUTPUT_SIZE
+from synthetic_images import card_photo
+
+def hwm_kb():
+    with open("/proc/self/status") as fh:
+        return next(int(line.split()[1]) for line in fh if line.startswith("VmHWM:"))
+
+def fit(image):
+    cw, ch = DOCUMENT_OUTPUT_SIZE
+    h, w = image.shape[:2]
+    scale = min(cw / w, ch / h)
+    size = (max(1, int(w * scale)), max(1, int(h * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_LANCZOS4)
+
+photos = [
+    card_photo({width}, {height}, cards={cards}, seed=seed)[0] for seed in range({photos})
+]
+output_size = DOCUMENT_OUTPUT_SIZE if {capped} else None
+with open("/proc/self/clear_refs", "w") as fh:
+    fh.write("5")  # reset VmHWM so building the photos does not count
+base = hwm_kb()
+per_doc, sizes, fitted = [], [], []
+for image in photos:
+    start = time.perf_counter()
+    docs = process_image_to_documents(image, enhance_mode={enhance!r}, output_size=output_size)
+    per_doc.append((time.perf_counter() - start) * 1000 / len(docs))
+    sizes.extend(doc.shape[1] * doc.shape[0] for doc in docs)
+    fitted.extend(fit(doc) for doc in docs)
+peak = hwm_kb()
+with open({dump!r}, "wb") as fh:
+    pickle.dump(fitted, fh)
+print(json.dumps({{
+    "ms": statistics.median(per_doc),
+    "peak_mb": (peak - base) / 1024,
+    "mp": statistics.median(sizes) / 1_000_000,
+}}))
+"""
+
+
+def _psnr(reference, candidate) -> float:
+    import cv2
+
+    if reference.shape != candidate.shape:
+        candidate = cv2.resize(candidate, (reference.shape[1], reference.shape[0]))
+    return float(cv2.PSNR(reference, candidate))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark per-document warp and enhance.")
+    parser.add_argument("--photos", type=int, default=12)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--cards", type=int, default=1, help="Cards per photo (1-4)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for enhance in ("soft", "hard"):
+            print(f"enhance_mode={enhance}")
+            fitted = {}
+            for label, capped in MODES.items():
+                dump = os.path.join(tmp, f"{enhance}-{capped}.pickle")
+                code = _CHILD.format(
+                    root=ROOT, scripts=SCRIPTS, width=args.width, height=args.height,
+                    photos=args.photos, cards=args.cards, capped=capped, enhance=enhance, dump=dump,
+                )
+                out = subprocess.run(
+                    [sys.executable, "-c", code], check=True, capture_output=True, text=True
+                ).stdout
+                result = json.loads(out)
+                with open(dump, "rb") as fh:
+                    fitted[label] = pickle.load(fh)
+                print(
+                    f"  {label:<10} {result['ms']:6.1f} ms/doc   peak +{result['peak_mb']:5.0f} MB"
+                    f"   doc {result['mp']:.2f} MP"
+                )
+            scores = [_psnr(a, b) for a, b in zip(fitted["native"], fitted["slot size"])]
+            print(f"  PSNR on the page slot: median {sorted(scores)[len(scores) // 2]:.1f} dB")
+
+
+if __name__ == "__main__":
+    main()
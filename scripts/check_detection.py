@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Accuracy-vs-speed regression check for document detection.
+
+Runs ``process_image_to_documents`` over a golden set of annotated photos and
+compares the result with ``detection_baseline.json``:
+  - recall:        ground-truth cards matched with IoU >= --iou
+  - iou:           mean IoU of the matched cards
+  - corner error:  mean distance of each detected corner to its true corner,
+                   in % of the card's diagonal
+  - extra:         detections matching no card
+  - latency:       detection and total (detect + warp + enhance) p50 / p95
+
+The golden set is a fixed list of synthetic photos (synthetic_images.py, the
+same seeds every run, JPEG round-tripped like an upload) plus any annotated
+real samples in ``scripts/golden/``: image files next to a ``labels.json``
+mapping each file name to its card quads, e.g.
+``{"lote_03.jpg": [[[x, y], [x, y], [x, y], [x, y]], ...]}`` with corners in
+pixels of the full-size image. Only add samples with faces and document
+numbers blurred out.
+
+Fails when recall or IoU drop, corner error grows or the latency regresses by
+more than the tolerances. Latencies are compared after dividing by a fixed
+OpenCV calibration workload timed on the same machine, so a baseline recorded
+on a laptop still holds on a slower CI runner. Any card a photo lost relative
+to the baseline is listed by name.
+
+Usage:
+    python scripts/check_detection.py
+    python scripts/check_detection.py --latency-tolerance 0.5
+    python scripts/check_detection.py --update-baseline
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, SCRIPTS)
+
+from app.services.img_pdf.image_processor import (  # noqa: E402
+    order_points,
+    process_image_to_documents,
+)
+from bench_detection import labelled_set, percentile, quad_iou  # noqa: E402
+from synthetic_images import card_photo, encode_jpeg  # noqa: E402
+
+BASELINE_PATH = os.path.join(SCRIPTS, "detection_baseline.json")
+SAMPLES_DIR = os.path.join(SCRIPTS, "golden")
+
+# name -> (width, height, card_photo kwargs); harder than labelled_set's mix.
+_HARD_CASES = {
+    "tilt-25": (4000, 3000, {"cards": 2, "seed": 101, "max_tilt_deg": 25.0}),
+    "tilt-25-portrait": (3000, 4000, {"cards": 1, "seed": 102, "max_tilt_deg": 25.0}),
+    "perspective-8": (4000, 3000, {"cards": 1, "seed": 103, "perspective": 0.08}),
+    "perspective-8-four": (4000, 3000, {"cards": 4, "seed": 104, "perspective": 0.08}),
+    "small-photo": (1600, 1200, {"cards": 2, "seed": 105}),
+    "small-photo-four": (1600, 1200, {"cards": 4, "seed": 106}),
+}
+
+
+def _roundtrip(image: np.ndarray, quality: int = 85) -> np.ndarray:
+    data = np.frombuffer(encode_jpeg(image, quality=quality), np.uint8)
+    return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+
+def golden_set(synthetic: int, samples_dir: str):
+    """Yield ``(name, image, quads)`` for every photo of the golden set."""
+    for seed, (image, quads) in enumerate(labelled_set(synthetic, 4000, 3000)):
+        yield f"synthetic-{seed:02d}", _roundtrip(image), quads
+    for name, (width, height, kwargs) in _HARD_CASES.items():
+        image, quads = card_photo(width, height, **kwargs)
+        yield name, _roundtrip(image), quads
+
+    labels_path = os.path.join(samples_dir, "labels.json")
+    if not os.path.isfile(labels_path):
+        return
+    with open(labels_path, encoding="utf-8") as fh:
+        labels = json.load(fh)
+    for filename in sorted(labels):
+        image = cv2.imread(os.path.join(samples_dir, filename), cv2.IMREAD_COLOR)
+        if image is None:
+            raise SystemExit(f"{filename}: listed in labels.json but not readable")
+        quads = [np.array(quad, dtype=np.float32) for quad in labels[filename]]
+        yield f"real/{filename}", image, quads
+
+
+def calibrate(repeat: int = 7) -> float:
+    """Median ms of a fixed OpenCV workload (grey, blur, Canny, contours of a photo)."""
+    image, _ = card_photo(2400, 1800, cards=2, seed=0)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        edges = cv2.Canny(cv2.GaussianBlur(grey, (5, 5), 0), 50, 150)
+        cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def score(
+    truth: list[np.ndarray], detected: list[np.ndarray], min_iou: float
+) -> tuple[list[tuple[float, float]], int]:
+    """Match quads to detections: ``(iou, corner_error_pct)`` per hit, unmatched count."""
+    detected = list(detected)
+    hits = []
+    for quad in truth:
+        scores = [quad_iou(quad, found) for found in detected]
+        if not scores or max(scores) < min_iou:
+            continue
+        found = detected.pop(int(np.argmax(scores)))
+        expected = order_points(quad.astype(np.float32))
+        diagonal = float(np.linalg.norm(expected[2] - expected[0]))
+        corner = float(np.linalg.norm(found - expected, axis=1).mean()) / diagonal * 100
+        hits.append((max(scores), corner))
+    return hits, len(detected)
+
+
+def measure(photos, min_iou: float, repeat: int) -> dict:
+    images: dict[str, int] = {}
+    ious: list[float] = []
+    corners: list[float] = []
+    detect_ms: list[float] = []
+    total_ms: list[float] = []
+    cards = extra = 0
+    for name, image, truth in photos:
+        runs = []
+        for _ in range(repeat):
+            stats: dict = {}
+            start = time.perf_counter()
+            process_image_to_documents(image, max_docs=6, stats=stats)
+            runs.append(((time.perf_counter() - start) * 1000, stats))
+        total, stats = min(runs, key=lambda run: run[0])
+        total_ms.append(total)
+        detect_ms.append(min(run[1]["detect_ms"] for run in runs))
+
+        hits, unmatched = score(truth, stats["quads"], min_iou)
+        images[name] = len(hits)
+        cards += len(truth)
+        extra += unmatched
+        ious.extend(iou for iou, _ in hits)
+        corners.extend(corner for _, corner in hits)
+
+    matched = sum(images.values())
+    return {
+        "photos": len(images),
+        "cards": cards,
+        "recall": matched / cards if cards else 0.0,
+        "iou": statistics.fmean(ious) if ious else 0.0,
+        "corner_error_pct": statistics.fmean(corners) if corners else 0.0,
+        "extra": extra,
+        "detect_p50_ms": statistics.median(detect_ms),
+        "detect_p95_ms": percentile(detect_ms, 95),
+        "total_p50_ms": statistics.median(total_ms),
+        "total_p95_ms": percentile(total_ms, 95),
+        "images": images,
+    }
+
+
+def compare(result: dict, baseline: dict, args) -> list[str]:
+    failures = []
+    if result["recall"] < baseline["recall"] - args.recall_drop:
+        failures.append(f"recall {result['recall']:.3f} < baseline {baseline['recall']:.3f}")
+    if result["iou"] < baseline["iou"] - args.iou_drop:
+        failures.append(f"mean IoU {result['iou']:.3f} < baseline {baseline['iou']:.3f}")
+    if result["corner_error_pct"] > baseline["corner_error_pct"] + args.corner_growth:
+        failures.append(
+            f"corner error {result['corner_error_pct']:.2f}% > baseline "
+            f"{baseline['corner_error_pct']:.2f}%"
+        )
+    if result["extra"] > baseline["extra"] + args.extra_growth:
+        failures.append(f"{result['extra']} extra detections > baseline {baseline['extra']}")
+
+    scale = result["calibration_ms"] / baseline["calibration_ms"]
+    for key in ("detect_p50_ms", "total_p50_ms", "total_p95_ms"):
+        allowed = baseline[key] * scale * (1 + args.latency_tolerance)
+        if result[key] > allowed:
+            failures.append(f"{key} {result[key]:.0f} ms > {allowed:.0f} ms allowed")
+
+    for name, hits in baseline.get("images", {}).items():
+        now = result["images"].get(name)
+        if now is not None and now < hits:
+            failures.append(f"{name}: {now} of {hits} cards found")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check detection accuracy and latency.")
+    parser.add_argument("--synthetic", type=int, default=16, help="labelled_set photos")
+    parser.add_argument("--samples", default=SAMPLES_DIR, help="Folder with labels.json")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU for a card to count as found")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per photo (fastest is kept)")
+    parser.add_argument("--recall-drop", type=float, default=0.0)
+    parser.add_argument("--iou-drop", type=float, default=0.01)
+    parser.add_argument("--corner-growth", type=float, default=0.25,
+                        help="Allowed growth of the corner error, in % of the diagonal")
+    parser.add_argument("--extra-growth", type=int, default=0)
+    parser.add_argument(
+        "--latency-tolerance",
+        type=float,
+        default=float(os.getenv("DETECTION_LATENCY_TOLERANCE", "0.25")),
+        help="Allowed slowdown after calibration (default: 0.25 = 25%%)",
+    )
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Write this run as the new baseline instead of checking")
+    args = parser.parse_args()
+
+    photos = list(golden_set(args.synthetic, args.samples))
+    # Warm OpenCV up so the first photo is not penalised.
+    process_image_to_documents(photos[0][1], max_docs=6)
+    calibration_ms = calibrate()
+    result = measure(photos, args.iou, args.repeat)
+    result["calibration_ms"] = calibration_ms
+
+    print(
+        f"{result['photos']} photos, {result['cards']} cards | recall {result['recall']:.3f}"
+        f" | IoU {result['iou']:.3f} | corner error {result['corner_error_pct']:.2f}%"
+        f" | extra {result['extra']}"
+    )
+    print(
+        f"detect p50 {result['detect_p50_ms']:.1f} ms, p95 {result['detect_p95_ms']:.1f} ms"
+        f" | total p50 {result['total_p50_ms']:.0f} ms, p95 {result['total_p95_ms']:.0f} ms"
+        f" | calibration {calibration_ms:.1f} ms"
+    )
+
+    if args.update_baseline:
+        rounded = {k: round(v, 4) if isinstance(v, float) else v for k, v in result.items()}
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(rounded, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        print(f"Baseline written to {os.path.relpath(args.baseline, ROOT)}")
+        return
+
+    if not os.path.isfile(args.baseline):
+        raise SystemExit(f"No baseline at {args.baseline}; run with --update-baseline first.")
+    with open(args.baseline, encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    failures = compare(result, baseline, args)
+    if failures:
+        print("\nDetection check failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
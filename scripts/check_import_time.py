@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Import-time regression check for app startup and CLI commands.
+
+Runs each scenario in a fresh interpreter with ``python -X importtime`` and
+fails when:
+  - a heavy CV module (cv2, numpy, PIL) is imported, or
+  - the total import time of the process exceeds the budget.
+
+The image pipeline must import the CV stack lazily, on first use.
+
+Usage:
+    python scripts/check_import_time.py
+    python scripts/check_import_time.py --budget-ms 600
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+FORBIDDEN = ("cv2", "numpy", "PIL")
+
+SCENARIOS = {
+    "create_app": [sys.executable, "-X", "importtime", "-c", "from app import create_app; create_app()"],
+    "flask init-db": [sys.executable, "-X", "importtime", "-m", "flask", "--app", "run.py", "init-db"],
+    "flask cleanup-old-jobs": [
+        sys.executable, "-X", "importtime", "-m", "flask", "--app", "run.py", "cleanup-old-jobs",
+    ],
+    "flask archive-old-jobs --help": [
+        sys.executable, "-X", "importtime", "-m", "flask", "--app", "run.py", "archive-old-jobs", "--help",
+    ],
+    "flask cleanup-sessions": [
+        sys.executable, "-X", "importtime", "-m", "flask", "--app", "run.py", "cleanup-sessions",
+    ],
+    "flask cleanup-preview-cache": [
+        sys.executable, "-X", "importtime", "-m", "flask", "--app", "run.py", "cleanup-preview-cache",
+    ],
+    "flask img-to-pdf-batch --help": [
+        sys.executable, "-X", "importtime", "-m", "flask", "--app", "run.py", "img-to-pdf-batch", "--help",
+    ],
+    "flask backup-db --help": [
+        sys.executable, "-X", "importtime", "-m", "flask", "--app", "run.py", "backup-db", "--help",
+    ],
+}
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def _parse(stderr: str) -> tuple[set[str], int]:
+    """Return the imported module names and the total self time in microseconds."""
+    modules: set[str] = set()
+    total_us = 0
+    for line in stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        modules.add(match.group(4))
+        total_us += int(match.group(1))
+    return modules, total_us
+
+
+def run_scenario(name: str, cmd: list[str], env: dict) -> tuple[set[str], int]:
+    proc = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"[{name}] command failed:\n{proc.stderr[-2000:]}")
+    return _parse(proc.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check startup import cost.")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=float(os.getenv("IMPORT_BUDGET_MS", "1000")),
+        help="Maximum total import time per scenario (default: 1000)",
+    )
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.update(
+            {
+                "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'app.db')}",
+                "SESSION_SQLITE_PATH": os.path.join(tmp, "sessions.db"),
+                "IMG_PREVIEW_CACHE_DIR": os.path.join(tmp, "preview_cache"),
+                "PYTHONDONTWRITEBYTECODE": "1",
+            }
+        )
+        for name, cmd in SCENARIOS.items():
+            modules, total_us = run_scenario(name, cmd, env)
+            heavy = [m for m in FORBIDDEN if m in modules]
+            total_ms = total_us / 1000.0
+            status = "ok"
+            if heavy:
+                status = "FAIL"
+                failures.append(f"{name}: imported {', '.join(heavy)}")
+            if total_ms > args.budget_ms:
+                status = "FAIL"
+                failures.append(f"{name}: imports took {total_ms:.0f} ms > {args.budget_ms:.0f} ms")
+            print(f"{status:<5} {name:<30} imports={total_ms:7.1f} ms  heavy={heavy or '-'}")
+
+    if failures:
+        print("\nImport-time check failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 #!/bin/sh
-# Runs daily cleanup of ImgToPdfJob records older than 20 days.
+# Runs daily: moves the PDFs of ImgToPdfJob records older than ARCHIVE_AFTER_DAYS
+# (20) to the archive in data/archive, and cleans up expired sessions and stale
+# preview images.
 # Runs on the Lightsail HOST at 02:00 UTC (= 23:00 ART, UTC-3).
 #
 # Crontab entry (on the host):
@@ -8,4 +10,8 @@
 # Log: /var/log/quatro_gnc_cleanup.log
 
 docker compose -f /home/ubuntu/quatro_gnc/docker-compose.yml exec -T web \
-    flask --app run.py cleanup-old-jobs >> /var/log/quatro_gnc_cleanup.log 2>&1
+    flask --app run.py archive-old-jobs >> /var/log/quatro_gnc_cleanup.log 2>&1
+docker compose -f /home/ubuntu/quatro_gnc/docker-compose.yml exec -T web \
+    flask --app run.py cleanup-sessions >> /var/log/quatro_gnc_cleanup.log 2>&1
+docker compose -f /home/ubuntu/quatro_gnc/docker-compose.yml exec -T web \
+    flask --app run.py cleanup-preview-cache >> /var/log/quatro_gnc_cleanup.log 2>&1
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+End-to-end HTTP load test against a local gunicorn.
+
+Boots gunicorn with ``gunicorn.conf.py`` against a temporary SQLite database,
+seeds one user per virtual user in a shared workspace, and has each virtual
+user log in (with its CSRF token, like the browser) and then loop over a
+weighted mix of:
+  - preview:   POST /tools/img-to-pdf/preview with synthetic card photos
+  - generate:  POST /tools/img-to-pdf/generate from the last preview's tokens
+  - table:     GET  /tools/img-to-pdf/table (the history polling)
+  - download:  GET  /tools/img-to-pdf/<id>/download of a PDF it generated
+A generate without a preview yet runs a preview first; a download without a
+PDF yet runs a generate first.
+
+Photos default to 2400x1800, the size the browser downscales uploads to
+(IMG_UPLOAD_MAX_EDGE). Server RSS is sampled from /proc every 0.5 s (Linux
+only); workers recycled by max_requests are picked up as they appear.
+
+Reports per route: requests, errors (non-2xx or no answer), throughput and
+latency p50/p90/p95/p99/max; plus peak RSS of the master and workers.
+
+Usage:
+    python scripts/loadtest.py
+    python scripts/loadtest.py --workers 2 --concurrency 6 --duration 120
+    python scripts/loadtest.py --mix preview=2,generate=1,table=6,download=1 \
+        --env GUNICORN_MAX_REQUESTS=0 --json results.json
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_gunicorn_start import _children, _memory, _multipart  # noqa: E402
+from synthetic_images import card_photo, encode_jpeg  # noqa: E402
+
+ROUTES = ("preview", "generate", "table", "download")
+PASSWORD = "loadtest-pass"
+_CSRF_RE = re.compile(r'name="csrf_token" value="([^"]+)"')
+
+_SEED = """
+import sys
+from werkzeug.security import generate_password_hash
+from app import _upgrade_schema, create_app
+from app.extensions import db
+from app.models import User, Workspace
+
+app = create_app()
+with app.app_context():
+    db.create_all()
+    _upgrade_schema()
+    workspace = Workspace(name="loadtest")
+    db.session.add(workspace)
+    db.session.flush()
+    password_hash = generate_password_hash({password!r})
+    for n in range({users}):
+        db.session.add(User(
+            username=f"load{{n}}", password_hash=password_hash, role="user",
+            workspace_id=workspace.id,
+        ))
+    db.session.commit()
+"""
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def _parse_mix(value: str) -> dict[str, int]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in ROUTES:
+            raise argparse.ArgumentTypeError(f"unknown route {name!r} (use {', '.join(ROUTES)})")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.statuses: dict[str, dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, route: str, ms: float, status: int) -> None:
+        with self.lock:
+            self.latencies[route].append(ms)
+            self.statuses[route][status] += 1
+            if not 200 <= status < 300:
+                self.errors[route] += 1
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, index: int, base: str, args, photos: list[bytes], results: Results,
+                 stop_at: float):
+        super().__init__(daemon=True)
+        self.username = f"load{index}"
+        self.base = base
+        self.args = args
+        self.photos = photos
+        self.results = results
+        self.stop_at = stop_at
+        self.rng = random.Random(index)
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+        self.csrf = ""
+        self.documents: list[dict] = []
+        self.job_ids: list[int] = []
+
+    def _request(self, route: str, path: str, data=None, headers=None) -> tuple[int, bytes]:
+        req = urllib.request.Request(f"{self.base}{path}", data=data, headers=headers or {})
+        start = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.args.timeout + 10) as resp:
+                status, body = resp.status, resp.read()
+        except urllib.error.HTTPError as exc:
+            status, body = exc.code, exc.read()
+        except OSError:
+            status, body = 0, b""
+        if route:
+            self.results.record(route, (time.perf_counter() - start) * 1000, status)
+        return status, body
+
+    def login(self) -> None:
+        _, body = self._request("", "/login")
+        token = _CSRF_RE.search(body.decode("utf-8", "replace"))
+        form = f"username={self.username}&password={PASSWORD}"
+        if token:
+            form += f"&csrf_token={token.group(1)}"
+        self._request("", "/login", data=form.encode())
+        # The page's form carries the token the app's fetch calls send.
+        _, body = self._request("", "/tools/img-to-pdf")
+        token = _CSRF_RE.search(body.decode("utf-8", "replace"))
+        if not token:
+            raise RuntimeError(f"{self.username} could not log in")
+        self.csrf = token.group(1)
+
+    def _headers(self, **extra) -> dict:
+        return {"X-Requested-With": "fetch", "X-CSRFToken": self.csrf, **extra}
+
+    def preview(self) -> None:
+        files = [
+            ("images", f"photo{n}.jpg", self.rng.choice(self.photos), "image/jpeg")
+            for n in range(self.args.photos_per_preview)
+        ]
+        body, content_type = _multipart({"enhance_mode": "soft"}, files)
+        status, payload = self._request(
+            "preview", "/tools/img-to-pdf/preview", body, self._headers(**{"Content-Type": content_type})
+        )
+        if status == 200:
+            previews = json.loads(payload).get("previews", [])
+            self.documents = [{"token": p["token"], "ops": []} for p in previews if p.get("token")]
+
+    def generate(self) -> None:
+        if not self.documents:
+            self.preview()
+            if not self.documents:
+                return
+        body = json.dumps({"documents": self.documents, "filename": "loadtest"}).encode()
+        headers = self._headers(**{
+            "Content-Type": "application/json",
+            "Idempotency-Key": uuid.uuid4().hex,
+        })
+        status, payload = self._request("generate", "/tools/img-to-pdf/generate", body, headers)
+        if status == 200:
+            self.job_ids.append(json.loads(payload)["job_id"])
+
+    def table(self) -> None:
+        self._request("table", "/tools/img-to-pdf/table", headers=self._headers())
+
+    def download(self) -> None:
+        if not self.job_ids:
+            self.generate()
+            if not self.job_ids:
+                return
+        job_id = self.rng.choice(self.job_ids[-20:])
+        self._request("download", f"/tools/img-to-pdf/{job_id}/download")
+
+    def run(self) -> None:
+        actions = {name: getattr(self, name) for name in ROUTES}
+        names = list(self.args.mix)
+        weights = [self.args.mix[name] for name in names]
+        while time.perf_counter() < self.stop_at:
+            actions[self.rng.choices(names, weights)[0]]()
+            if self.args.think:
+                time.sleep(self.rng.uniform(0, 2 * self.args.think))
+
+
+def _sample_memory(server_pid: int, peaks: dict, stop: threading.Event) -> None:
+    while not stop.wait(0.5):
+        master = _memory(server_pid).get("Rss", 0)
+        workers = {pid: _memory(pid).get("Rss", 0) for pid in _children(server_pid)}
+        peaks["master"] = max(peaks.get("master", 0), master)
+        peaks["worker"] = max([peaks.get("worker", 0), *workers.values()])
+        peaks["total"] = max(peaks.get("total", 0), master + sum(workers.values()))
+
+
+def _wait_ready(base: str, server: subprocess.Popen, limit: float = 180) -> None:
+    start = time.perf_counter()
+    while True:
+        try:
+            urllib.request.urlopen(f"{base}/login", timeout=1).read()
+            return
+        except OSError:  # refused, reset or timed out while workers boot
+            if server.poll() is not None or time.perf_counter() - start > limit:
+                raise RuntimeError("gunicorn did not start")
+            time.sleep(0.1)
+
+
+def run(args) -> dict:
+    print(f"Building {args.pool} synthetic photos ({args.width}x{args.height}) ...")
+    photos = [
+        encode_jpeg(card_photo(args.width, args.height, cards=1 + seed % 2, seed=seed)[0])
+        for seed in range(args.pool)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.update(
+            {
+                "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'app.db')}",
+                "SESSION_SQLITE_PATH": os.path.join(tmp, "sessions.db"),
+                "IMG_PREVIEW_CACHE_DIR": os.path.join(tmp, "preview_cache"),
+                "PROMETHEUS_MULTIPROC_DIR": os.path.join(tmp, "metrics"),
+                "ALLOW_SEED_DEMO": "false",
+                # Every virtual user logs in from 127.0.0.1.
+                "LOGIN_RATE_LIMIT": "0",
+                "GUNICORN_BIND": f"127.0.0.1:{args.port}",
+                "GUNICORN_WORKERS": str(args.workers),
+                "GUNICORN_TIMEOUT": str(args.timeout),
+                **dict(item.split("=", 1) for item in args.env),
+            }
+        )
+        subprocess.run(
+            [sys.executable, "-c", _SEED.format(password=PASSWORD, users=args.concurrency)],
+            cwd=ROOT, env=env, check=True, capture_output=True,
+        )
+
+        base = f"http://127.0.0.1:{args.port}"
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        peaks: dict = {}
+        stop = threading.Event()
+        try:
+            _wait_ready(base, server)
+            time.sleep(args.settle)  # let every worker finish its warm-up
+            results = Results()
+            users = [
+                VirtualUser(n, base, args, photos, results, stop_at=0)
+                for n in range(args.concurrency)
+            ]
+            for user in users:
+                user.login()
+
+            sampler = threading.Thread(
+                target=_sample_memory, args=(server.pid, peaks, stop), daemon=True
+            )
+            sampler.start()
+            print(f"Running {args.concurrency} virtual users for {args.duration:.0f} s ...")
+            start = time.perf_counter()
+            for user in users:
+                user.stop_at = start + args.duration
+                user.start()
+            for user in users:
+                user.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            stop.set()
+            server.terminate()
+            server.wait(timeout=30)
+
+    report = {
+        "workers": args.workers,
+        "concurrency": args.concurrency,
+        "elapsed_s": elapsed,
+        "routes": {},
+        "rss_mb": peaks,
+    }
+    for route in ROUTES:
+        latencies = results.latencies.get(route, [])
+        if not latencies:
+            continue
+        report["routes"][route] = {
+            "requests": len(latencies),
+            "errors": results.errors.get(route, 0),
+            "statuses": dict(results.statuses[route]),
+            "rps": len(latencies) / elapsed,
+            **{f"p{p}": _percentile(latencies, p) for p in (50, 90, 95, 99)},
+            "max": max(latencies),
+        }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HTTP load test against a local gunicorn.")
+    parser.add_argument("--workers", type=int, default=2, help="GUNICORN_WORKERS")
+    parser.add_argument("--timeout", type=int, default=120, help="GUNICORN_TIMEOUT")
+    parser.add_argument("--concurrency", type=int, default=4, help="Virtual users")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds of load")
+    parser.add_argument("--mix", type=_parse_mix, default="preview=3,generate=1,table=6,download=1",
+                        help="Route weights, e.g. preview=3,generate=1,table=6,download=1")
+    parser.add_argument("--photos-per-preview", type=int, default=2)
+    parser.add_argument("--think", type=float, default=0.5,
+                        help="Mean pause in seconds between a user's requests")
+    parser.add_argument("--pool", type=int, default=8, help="Distinct synthetic photos")
+    parser.add_argument("--width", type=int, default=2400)
+    parser.add_argument("--height", type=int, default=1800)
+    parser.add_argument("--port", type=int, default=5098)
+    parser.add_argument("--settle", type=float, default=3.0, help="Seconds to wait after boot")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra server environment (repeatable)")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+    if isinstance(args.mix, str):
+        args.mix = _parse_mix(args.mix)
+
+    report = run(args)
+    total = sum(route["requests"] for route in report["routes"].values())
+    errors = sum(route["errors"] for route in report["routes"].values())
+    print(
+        f"\n{args.workers} workers, {args.concurrency} users, {report['elapsed_s']:.0f} s: "
+        f"{total} requests ({total / report['elapsed_s']:.2f}/s), "
+        f"{errors} errors ({100 * errors / max(total, 1):.1f}%)"
+    )
+    print(f"{'route':<10}{'reqs':>6}{'err':>5}{'req/s':>7}"
+          f"{'p50':>8}{'p90':>8}{'p95':>8}{'p99':>8}{'max':>8}  (ms)")
+    for name, r in report["routes"].items():
+        print(
+            f"{name:<10}{r['requests']:>6}{r['errors']:>5}{r['rps']:>7.2f}"
+            f"{r['p50']:>8.0f}{r['p90']:>8.0f}{r['p95']:>8.0f}{r['p99']:>8.0f}{r['max']:>8.0f}"
+        )
+        failed = {status: n for status, n in r["statuses"].items() if not 200 <= status < 300}
+        if failed:
+            print(f"{'':<10}non-2xx: {failed}")
+    rss = report["rss_mb"]
+    print(
+        f"peak RSS: master {rss.get('master', '?')} MB, largest worker "
+        f"{rss.get('worker', '?')} MB, total {rss.get('total', '?')} MB"
+    )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
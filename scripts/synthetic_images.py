@@ -0,0 +1,111 @@
+"""
+Synthetic "photo of ID cards" generator shared by the benchmark scripts.
+
+Each photo is a textured background with one or more light cards (ID-1
+aspect ratio, printed text and an inner border) pasted under a random
+rotation/perspective. The ground-truth corner quads are returned alongside
+the image so detection can be scored.
+"""
+
+import cv2
+import numpy as np
+
+CARD_ASPECT = 85.6 / 53.98
+
+
+def _card_texture(rng: np.random.Generator, width: int, height: int) -> np.ndarray:
+    tone = int(rng.integers(205, 245))
+    card = np.full((height, width, 3), tone, np.uint8)
+    border = max(4, width // 40)
+    cv2.rectangle(
+        card,
+        (border, border),
+        (width - border - 1, height - border - 1),
+        (int(rng.integers(60, 140)),) * 3,
+        max(2, width // 220),
+    )
+    cv2.rectangle(
+        card,
+        (width // 14, height // 5),
+        (width // 14 + width // 4, height // 5 + int(height / 2.2)),
+        (150, 150, 150),
+        -1,
+    )
+    scale = width / 900.0
+    for row in range(4):
+        y = int(height * (0.28 + row * 0.14))
+        cv2.putText(
+            card,
+            f"APELLIDO NOMBRE {int(rng.integers(10_000_000, 99_999_999))}",
+            (width // 14 + width // 4 + int(30 * scale), y),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.9 * scale,
+            (30, 30, 30),
+            max(1, int(2 * scale)),
+        )
+    return card
+
+
+def _background(rng: np.random.Generator, width: int, height: int) -> np.ndarray:
+    base = rng.integers(40, 150, size=3)
+    small = rng.integers(-25, 25, size=(height // 64 + 2, width // 64 + 2, 3)).astype(np.int16)
+    noise = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    background = np.clip(base.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    return cv2.GaussianBlur(background, (0, 0), 3)
+
+
+def card_photo(
+    width: int = 4000,
+    height: int = 3000,
+    cards: int = 1,
+    seed: int = 0,
+    max_tilt_deg: float = 12.0,
+    perspective: float = 0.04,
+) -> tuple[np.ndarray, list[np.ndarray]]:
+    """Return a BGR photo and the ground-truth quad (4x2, TL/TR/BR/BL) per card."""
+    rng = np.random.default_rng(seed)
+    photo = _background(rng, width, height)
+    quads: list[np.ndarray] = []
+
+    cols = 1 if cards == 1 else 2
+    rows = int(np.ceil(cards / cols))
+    cell_w = width / cols
+    cell_h = height / rows
+    for idx in range(cards):
+        col, row = idx % cols, idx // cols
+        card_w = int(min(cell_w * rng.uniform(0.55, 0.7), cell_h * rng.uniform(0.55, 0.7) * CARD_ASPECT))
+        card_h = int(card_w / CARD_ASPECT)
+        card = _card_texture(rng, card_w, card_h)
+
+        cx = cell_w * (col + 0.5) + rng.uniform(-0.08, 0.08) * cell_w
+        cy = cell_h * (row + 0.5) + rng.uniform(-0.08, 0.08) * cell_h
+        angle = np.deg2rad(rng.uniform(-max_tilt_deg, max_tilt_deg))
+        rot = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+        corners = np.array(
+            [[-card_w / 2, -card_h / 2], [card_w / 2, -card_h / 2],
+             [card_w / 2, card_h / 2], [-card_w / 2, card_h / 2]]
+        )
+        jitter = rng.uniform(-perspective, perspective, size=(4, 2)) * [card_w, card_h]
+        dst = (corners + jitter) @ rot.T + [cx, cy]
+        dst = dst.astype(np.float32)
+
+        src = np.array(
+            [[0, 0], [card_w - 1, 0], [card_w - 1, card_h - 1], [0, card_h - 1]],
+            dtype=np.float32,
+        )
+        matrix = cv2.getPerspectiveTransform(src, dst)
+        warped = cv2.warpPerspective(card, matrix, (width, height))
+        mask = cv2.warpPerspective(np.full((card_h, card_w), 255, np.uint8), matrix, (width, height))
+        photo[mask > 0] = warped[mask > 0]
+        quads.append(dst)
+
+    shade = np.linspace(0.85, 1.1, width, dtype=np.float32)[None, :, None]
+    photo = np.clip(photo.astype(np.float32) * shade, 0, 255).astype(np.uint8)
+    return photo, quads
+
+
+def encode_jpeg(image_bgr: np.ndarray, quality: int = 90) -> bytes:
+    ok, buffer = cv2.imencode(".jpg", image_bgr, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encode failed")
+    return buffer.tobytes()